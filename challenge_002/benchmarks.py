@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+
+import random, sys, time
+
+def timed(label, count, func):
+    # Run something once, and show how long it took per item
+    started = time.perf_counter()
+    ret = func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<40} {elapsed:8.3f}s  {elapsed / count * 1e6:10.2f}us per item")
+    return ret
+
+def make_solutions(count, base=50):
+    # Build a pile of solved grids.  Solving is slow compared to what we want to
+    # measure, so solve a few and relabel the digits to get the rest, which
+    # still gives valid grids that decode to different strings
+    import sudoku
+    random.seed(42)
+    bases = []
+    for _ in range(base):
+        value = "".join(random.choice(sudoku.CHARS[1:]) for _ in range(8))
+        bases.append(sudoku.create_encoded_grid(value))
+    ret = []
+    for i in range(count):
+        digits = list(range(1, 10))
+        random.shuffle(digits)
+        ret.append([digits[cell - 1] for cell in bases[i % base]])
+    return ret
+
+def bench_audit(count=5000):
+    # Compare checking and decoding a batch of grids one at a time against
+    # the NumPy version
+    import sudoku
+
+    solutions = make_solutions(count)
+    print(f"Auditing {count} grids")
+
+    def loop():
+        valid = [all(len(sudoku.valid_options(grid, x, y)) == 1 for x, y in sudoku.enum_xy(9)) for grid in solutions]
+        return valid, [sudoku.decode_grid(grid) for grid in solutions]
+    valid, decoded = timed("valid_options + decode_grid loop", count, loop)
+    timed("decode_grid loop", count, lambda: [sudoku.decode_grid(grid) for grid in solutions])
+
+    array = timed("grids_to_array", count, lambda: sudoku.grids_to_array(solutions))
+    ret = timed("audit_grids", count, lambda: sudoku.audit_grids(array, array))
+
+    if list(ret["valid"]) != valid or ret["decoded"] != decoded:
+        raise Exception("audit_grids doesn't agree with decode_grid!")
+
+def legacy_valid_options(grid, x, y):
+    # valid_options as it was before the lookup tables, for comparison
+    import sudoku
+    ret = set(range(1, 10))
+    for check_x in range(9):
+        if check_x != x:
+            ret.discard(grid[check_x + y * 9])
+    for check_y in range(9):
+        if check_y != y:
+            ret.discard(grid[x + check_y * 9])
+    off_x, off_y = (x // 3) * 3, (y // 3) * 3
+    for check_x, check_y in sudoku.enum_xy(3, off_x, off_y):
+        if (check_x, check_y) != (x, y):
+            ret.discard(grid[check_x + check_y * 9])
+    return ret
+
+def legacy_decode_grid(grid):
+    # decode_grid as it was before the lookup tables, for comparison
+    import sudoku
+    mul, val = 1, 0
+    for off in range(0, 9, 3):
+        numbers = list(range(1, 10))
+        for x, y in sudoku.enum_xy(3, off, off):
+            temp = numbers.index(grid[x + y * 9])
+            val += temp * mul
+            mul *= len(numbers)
+            numbers.pop(temp)
+    decoded = ""
+    for _ in range(8):
+        decoded += sudoku.CHARS[val % len(sudoku.CHARS)]
+        val //= len(sudoku.CHARS)
+    return decoded.split("\x00")[0]
+
+def bench_tables(count=200):
+    # Per call cost of the hot functions with and without the 
+    # precomputed peer and special cell tables
+    import sudoku
+
+    solutions = make_solutions(count)
+    cells = [(x, y) for x, y in sudoku.enum_xy(9)]
+    calls = count * len(cells)
+
+    def check(func):
+        return [func(grid, x, y) for grid in solutions for x, y in cells]
+    old = timed("legacy valid_options", calls, lambda: check(legacy_valid_options))
+    new = timed("valid_options", calls, lambda: check(sudoku.valid_options))
+    if old != new:
+        raise Exception("valid_options doesn't match the legacy version!")
+
+    # Decoding is fast, so run through the grids a few times to get a stable number
+    repeat = solutions * 50
+    old = timed("legacy decode_grid", len(repeat), lambda: [legacy_decode_grid(grid) for grid in repeat])
+    new = timed("decode_grid", len(repeat), lambda: [sudoku.decode_grid(grid) for grid in repeat])
+    if old != new:
+        raise Exception("decode_grid doesn't match the legacy version!")
+
+def legacy_scrabble_decode(grid, cipher):
+    # scrabble.decode_grid as it was before scanning for runs, for comparison
+    import scrabble
+    ret = {}
+    for (x, y), val in grid.items():
+        for dir_x, dir_y in ((1, 0), (0, 1)):
+            if "".join(" " if grid.get((x + off * dir_x, y + off * dir_y), " ") == " " else "." for off in range(-1, 4)) == " ....":
+                code = "".join(grid.get((x + off * dir_x, y + off * dir_y), " ") for off in range(2, 4))
+                code = cipher.index(code)
+                ret[code // len(scrabble.TO_ENCODE)] = scrabble.TO_ENCODE[code % len(scrabble.TO_ENCODE)]
+    return "".join(ret[x] for x in sorted(ret))
+
+def bench_scrabble_decode(count=50, repeat=20):
+    # Build a corpus of boards, then compare decoding them the old way, one at
+    # a time, and in bulk.  Needs the word list for scrabble.py
+    import scrabble
+
+    random.seed(42)
+    words, boards = [], []
+    while len(boards) < count:
+        word = "".join(random.choice(scrabble.TO_ENCODE) for _ in range(random.randint(1, 8)))
+        board = scrabble.build_board(word)
+        if board is not None:
+            words.append(word)
+            boards.append(board)
+    print(f"Decoding {count} boards {repeat} times")
+
+    cipher = scrabble.get_common_middle_letters()
+    grids = [board.to_dict() for board in boards] * repeat
+    rows = [board.rows() for board in boards] * repeat
+    expected = words * repeat
+
+    old = timed("legacy decode_grid", len(grids), lambda: [legacy_scrabble_decode(grid, cipher) for grid in grids])
+    new = timed("decode_grid", len(grids), lambda: [scrabble.decode_grid(grid, cipher) for grid in grids])
+    bulk = timed("decode_grids (grid dicts)", len(grids), lambda: scrabble.decode_grids(grids, cipher))
+    bulk_rows = timed("decode_grids (rows)", len(rows), lambda: scrabble.decode_grids(rows, cipher))
+    if not (old == new == bulk == bulk_rows == expected):
+        raise Exception("Scrabble decoders don't agree!")
+
+def bench_scrabble_bag(count=2000):
+    # Compare checking candidate words against a bag one at a time with fits,
+    # and all at once with feasible.  Needs the word list for scrabble.py
+    import scrabble
+
+    index = scrabble.get_word_index()
+    cipher = scrabble.get_common_middle_letters()
+    random.seed(42)
+    jobs = []
+    for _ in range(count):
+        bag = bytearray(random.randint(0, 4) for _ in scrabble.BAG_SLOTS)
+        jobs.append((random.choice(cipher), random.choice([7, 8]), bag))
+    # Build the count matrices ahead of time, so only the checks are timed
+    for pair, max_len, bag in jobs:
+        index.feasible(pair, max_len, bag)
+    print(f"Checking {count} candidate lists against random bags")
+
+    old = timed("fits", count, lambda: [[x for x in index.lookup(pair, max_len) if index.fits(x, bag)] for pair, max_len, bag in jobs])
+    new = timed("feasible", count, lambda: [index.feasible(pair, max_len, bag) for pair, max_len, bag in jobs])
+    if old != new:
+        raise Exception("Bag checks don't agree!")
+
+BENCHMARKS = {
+    "audit": bench_audit,
+    "tables": bench_tables,
+    "scrabble_decode": bench_scrabble_decode,
+    "scrabble_bag": bench_scrabble_bag,
+}
+
+def run_comparisons(names=None):
+    # Run some or all of the comparisons, this is also used by COMPARE in 
+    # run_benchmarks.py, which sets up a word list for the scrabble ones
+    for name in names or list(BENCHMARKS):
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}', options are: {', '.join(BENCHMARKS)}")
+            exit(1)
+        print("-" * 5 + " " + name + " " + "-" * (54 - len(name)))
+        BENCHMARKS[name]()
+
+def main():
+    run_comparisons(sys.argv[1:])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+# Shared code to write out puzzles from the sudoku and scrabble scripts, either
+# into a HTML template or as JSON lines
+
+import json, os, zipfile
+
+# Templates we've already loaded, so each one is only read from disk once
+_templates = {}
+
+def load_template(fn, placeholders):
+    # Read in a template, and split it up around each placeholder, so filling
+    # it in later is just a join.  The return is a list of alternating
+    # text and placeholders, always starting and ending with text
+    key = (fn, tuple(placeholders))
+    if key not in _templates:
+        with open(fn, "rt", encoding="utf-8") as f:
+            parts = [f.read()]
+        for placeholder in placeholders:
+            split = []
+            for i, part in enumerate(parts):
+                if i % 2 == 1:
+                    # Already a placeholder, leave it as is
+                    split.append(part)
+                else:
+                    for j, piece in enumerate(part.split(placeholder)):
+                        if j > 0:
+                            split.append(placeholder)
+                        split.append(piece)
+            parts = split
+        _templates[key] = parts
+    return _templates[key]
+
+def render(fn, values):
+    # Fill in a template, values is a dict of placeholder to the text to use
+    parts = load_template(fn, values.keys())
+    return "".join(values[part] if i % 2 == 1 else part for i, part in enumerate(parts))
+
+class PuzzleWriter:
+    # Writes out one or more puzzles.  The type of output is picked
+    # based off the path:
+    #   something.html  - A single page, each puzzle overwrites the last one
+    #   something.zip   - A bundle with one page per puzzle
+    #   something.jsonl - One line of JSON per puzzle, the template isn't used
+    #   anything else   - A directory with one page per puzzle
+    # Pages in a bundle or directory get unique names starting with prefix
+
+    def __init__(self, path, template, prefix="puzzle"):
+        self.path, self.template, self.prefix = path, template, prefix
+        self.count = 0
+        self.bundle, self.jsonl = None, None
+        if path.endswith(".zip"):
+            self.mode = "bundle"
+            self.bundle = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+        elif path.endswith(".jsonl"):
+            self.mode = "jsonl"
+            self.jsonl = open(path, "wt", newline="", encoding="utf-8")
+        elif path.endswith(".html"):
+            self.mode = "html"
+        else:
+            self.mode = "dir"
+            os.makedirs(path, exist_ok=True)
+
+    def next_name(self):
+        # Find a name for the next page that isn't already used
+        while True:
+            self.count += 1
+            name = f"{self.prefix}_{self.count:06d}.html"
+            if self.mode != "dir" or not os.path.exists(os.path.join(self.path, name)):
+                return name
+
+    def write(self, data, values):
+        # Write out one puzzle, data is the puzzle itself for JSON lines,
+        # values is what to fill in the template with for HTML
+        if self.mode == "jsonl":
+            self.jsonl.write(json.dumps(data) + "\n")
+            return
+
+        page = render(self.template, values)
+        if self.mode == "html":
+            with open(self.path, "wt", newline="", encoding="utf-8") as f:
+                f.write(page)
+        elif self.mode == "bundle":
+            self.bundle.writestr(self.next_name(), page)
+        else:
+            with open(os.path.join(self.path, self.next_name()), "wt", newline="", encoding="utf-8") as f:
+                f.write(page)
+
+    def close(self):
+        if self.bundle is not None:
+            self.bundle.close()
+            self.bundle = None
+        if self.jsonl is not None:
+            self.jsonl.close()
+            self.jsonl = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,31 +1,54 @@
 #!/usr/bin/env python3
 
-from collections import defaultdict
-from urllib.request import urlretrieve
-import gzip, os, random, sys
+from collections import Counter, defaultdict
+import gzip, json, os, random, sys
+import renderers, search_stats
 
 # The number of characters we encode, and the character set
 # Only use A-Z and 0-9 since more characters decreases the likelyhood of finding a puzzle
 MAX_CHARS = 10
 TO_ENCODE = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
-def get_words():
-    # To do this, we need a list of words.  We'll grab the list from online, a 750kb file, and load it.
+# Optional, prefer higher scoring moves so the game looks more realistic
+HIGH_SCORES = False
+# Optional, show counts of how much work the search did, and a file to write 
+# them to as JSON, along with every step the search took
+SEARCH_STATS = False
+STATS_TRACE = None
+
+# The tiles in a standard game
+DRAW_BAG = {
+    "E": 12, "A": 9, "I": 9, "O": 8, "N": 6,    # 1 point
+    "R": 6, "T": 6, "L": 4, "S": 4, "U": 4,     # 1 point
+    "D": 4, "G": 3,                             # 2 points
+    "B": 2, "C": 2, "M": 2, "P": 2,             # 3 points
+    "F": 2, "H": 2, "V": 2, "W": 2, "Y": 2,     # 4 points
+    "K": 1,                                     # 5 points
+    "J": 1, "X": 1,                             # 8 points
+    "Q": 1, "Z": 1,                             # 10 points
+    "*": 2,                                     # 0 points
+}
+
+# Anything we've loaded from the word list, so it's only loaded once per process
+_cache = {}
+
+def download_words():
+    # To do this, we need a list of words.  We'll grab the list from online, a 750kb file.
     fn = "collins-2019.jsonl.gz"
     if not os.path.isfile(fn):
+        from urllib.request import urlretrieve
         url = "https://gist.github.com/Q726kbXuN/14cf54435506c644bc0e2af5e35dd301/raw/efa4cf849dc72653d8f34a4609cc3b2144b4137b/collins-2019.jsonl.gz"
         urlretrieve(url, fn)
-    with gzip.open(fn, "rt") as f:
-        return [x for x in f.read().split("\n") if len(x)]
+    return fn
 
-def get_common_middle_letters():
+def build_cipher(words):
     # We're going to use the third and forth letters of four or more letter words
     # to encode the target value, to make the encoded string a bit hidden
     # and also prevent some bias problems from using the first letters
 
     # Get the frequency counts
     hits = defaultdict(int)
-    for word in get_words():
+    for word in words:
         if len(word) >= 4:
             hits[word[2:4]] += 1
 
@@ -40,48 +63,327 @@ def get_common_middle_letters():
         cipher.append(k)
     return cipher
 
-def is_in_bag(word, draw_bag, ignore_letters="", update_bag=False):
-    # Helper to tell us if a given word could come from a draw bag
-    extra = {x: 0 for x in draw_bag}
-    for x in ignore_letters:
-        if x in extra:
-            extra[x] += 1
-
-    for x in word:
-        if draw_bag[x] + extra[x] <= 0:
-            return False
-        extra[x] -= 1
-
-    if update_bag:
-        for x, val in extra.items():
-            draw_bag[x] += val
-
-    return True
-
-def place_word(word, grid, draw_bag, place, x, y, horiz):
-    # Place a word on the board, and remove the tiles from the bag
-
-    # Remove the letters from the draw bag
-    is_in_bag(word, draw_bag, grid[(x, y)], True)
+def get_compiled_words():
+    # Decompressing and parsing the word list is slow, so the first time we 
+    # see a word list, save a plain text copy of it, with the cipher on the 
+    # first line.  The name includes a hash of the source file so a new
+    # word list gets a new cache.  Returns the name of the cache file
+    if "compiled" not in _cache:
+        import hashlib
+        fn = download_words()
+        with open(fn, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:16]
+        compiled = f"{fn.split('.')[0]}.{digest}.{len(TO_ENCODE) * MAX_CHARS}.cache"
+
+        if not os.path.isfile(compiled):
+            with gzip.open(fn, "rt") as f:
+                words = [x for x in f.read().split("\n") if len(x)]
+            save_file(compiled, ("".join(build_cipher(words)) + "\n" + "\n".join(words)).encode("utf-8"))
+
+        _cache["compiled"] = compiled
+    return _cache["compiled"]
+
+def save_file(fn, data):
+    # Write to a temp file next to fn first, so a partial file is never used.
+    # The temp file's name is unique, so if several processes build the same
+    # file at once, they each write their own and the last one wins
+    import tempfile
+    fd, temp_fn = tempfile.mkstemp(prefix=os.path.basename(fn) + ".", suffix=".tmp", dir=os.path.dirname(os.path.abspath(fn)))
+    try:
+        # mkstemp makes the file only readable by us, give it the permissions
+        # any other new file would get, so the saved file can be shared
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_fn, 0o666 & ~umask)
+        with open(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_fn, fn)
+    except BaseException:
+        os.unlink(temp_fn)
+        raise
 
-    placed_letters = []
-
-    # And place the letters
-    for char in word:
-        if grid[(x, y)] not in (char, " "): 
-            raise Exception()
-        if grid[(x, y)] == " ":
-            placed_letters.append({"char": char, "pos": (x, y), "placed": True, "horiz": horiz})
-            grid[(x, y)] = char
-        else:
-            placed_letters.append({"char": char, "pos": (x, y), "placed": False, "horiz": horiz})
-
-        if horiz:
-            x += 1
-        else:
-            y += 1
+def get_words():
+    # Load the list of words
+    if "words" not in _cache:
+        with open(get_compiled_words(), "rt", encoding="utf-8") as f:
+            f.readline()
+            _cache["words"] = f.read().split("\n")
+    return _cache["words"]
 
-    place.append(placed_letters)    
+def get_common_middle_letters():
+    # Load our cipher, the list of middle letter pairs, this only needs to
+    # read the first line of the cache
+    if "cipher" not in _cache:
+        with open(get_compiled_words(), "rt", encoding="utf-8") as f:
+            row = f.readline().strip()
+        _cache["cipher"] = [row[i:i+2] for i in range(0, len(row), 2)]
+    return _cache["cipher"]
+
+class WordIndex:
+    # The word list grouped by the third and forth letters of each word, which
+    # is what our cipher uses, so finding candidates for a letter only looks
+    # at the words that could match.  The letter counts used to see if a word
+    # is in the bag are worked out for all the words of a pair the first time
+    # that pair is looked up, since an encode only uses a handful of pairs
+    def __init__(self, words):
+        self.by_pair = defaultdict(list)
+        for word in words:
+            if len(word) >= 4:
+                self.by_pair[word[2:4]].append(word)
+        self.counts = {}
+        self.counted = set()
+        self.lookups = {}
+        self.matrices = {}
+
+    def lookup(self, pair, max_len):
+        # Return all the words with a given middle pair, no longer than max_len
+        # in the same order as the word list
+        key = (pair, max_len)
+        if key not in self.lookups:
+            if pair not in self.counted:
+                self.counted.add(pair)
+                for word in self.by_pair.get(pair, []):
+                    self.counts[word] = tuple((letter, BAG_SLOTS.index(letter), count) for letter, count in Counter(word).items())
+            self.lookups[key] = [x for x in self.by_pair.get(pair, []) if len(x) <= max_len]
+        return self.lookups[key][:]
+
+    def fits(self, word, bag, ignore_letters=""):
+        # Could word be drawn from the bag of a Board, using the precomputed 
+        # letter counts.  Letters in ignore_letters don't need to come from 
+        # the bag
+        for letter, slot, count in self.counts[word]:
+            if count > bag[slot] + ignore_letters.count(letter):
+                return False
+        return True
+
+    def count_matrix(self, words):
+        # The letter counts for a list of words as an (N, 27) NumPy array, with
+        # one column for each slot in the bag
+        np = get_numpy()
+        ret = np.zeros((len(words), len(BAG_SLOTS)), dtype=np.int16)
+        for i, word in enumerate(words):
+            for _, slot, count in self.counts[word]:
+                ret[i, slot] = count
+        return ret
+
+    def feasible(self, pair, max_len, bag, ignore_letters=""):
+        # Same as lookup, but only the words that could be drawn from the bag 
+        # of a Board.  With NumPy, this checks every candidate in one go against
+        # a count matrix that's built the first time the pair is used, 
+        # otherwise it falls back to calling fits on each word
+        options = self.lookup(pair, max_len)
+        np = get_numpy()
+        if np is None:
+            return [x for x in options if self.fits(x, bag, ignore_letters)]
+
+        key = (pair, max_len)
+        if key not in self.matrices:
+            self.matrices[key] = self.count_matrix(options)
+        avail = np.frombuffer(bytes(bag), dtype=np.uint8).astype(np.int16)
+        for letter in ignore_letters:
+            if letter in BAG_SLOTS:
+                avail[BAG_SLOTS.index(letter)] += 1
+        keep = (self.matrices[key] <= avail).all(axis=1)
+        return [options[i] for i in np.flatnonzero(keep)]
+
+def get_numpy():
+    # NumPy is optional, and slow to import, so only load it when it's needed,
+    # returns None if it's not installed
+    if "numpy" not in _cache:
+        try:
+            import numpy
+            _cache["numpy"] = numpy
+        except ImportError:
+            _cache["numpy"] = None
+    return _cache["numpy"]
+
+# The word index, only built once per process
+_word_index = None
+
+def get_word_index():
+    global _word_index
+    if _word_index is None:
+        _word_index = WordIndex(get_words())
+    return _word_index
+
+# The slots in the bag of a Board, one for each letter and the blank tile
+BAG_SLOTS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ*"
+
+class Board:
+    # A 15x15 board stored as a flat bytearray, with a border of '#' cells all 
+    # the way around it so looking at a neighbour never needs a bounds check.
+    # The bag is a count of tiles for each slot in BAG_SLOTS.  Each word played
+    # can be taken back with undo, so a search can play and undo words in 
+    # place instead of copying the board for each attempt
+    SIZE = 15
+    STRIDE = SIZE + 2
+    EMPTY = ord(" ")
+    BORDER = ord("#")
+
+    def __init__(self, draw_bag):
+        self.cells = bytearray(b"#" * (self.STRIDE * self.STRIDE))
+        for x, y in enum_xy(self.SIZE, self.SIZE):
+            self.cells[self.index(x, y)] = self.EMPTY
+        self.bag = bytearray(draw_bag.get(x, 0) for x in BAG_SLOTS)
+        # Each word played as (word, x, y, horiz, offsets of the letters laid down)
+        self.played = []
+        # The cells with a letter in them, by letter, these are the only places
+        # a new word can cross the words already played
+        self.anchors = defaultdict(set)
+        # Whether a new tile can be laid in each cell when playing a word across
+        # or down.  A new tile can't have another tile on either side of it, so
+        # this is either every letter or none, and only changes near new tiles
+        self.open_across = bytearray(len(self.cells))
+        self.open_down = bytearray(len(self.cells))
+        for x, y in enum_xy(self.SIZE, self.SIZE):
+            self.refresh(self.index(x, y))
+
+    def index(self, x, y):
+        return (x + 1) + (y + 1) * self.STRIDE
+
+    def get(self, x, y):
+        return chr(self.cells[self.index(x, y)])
+
+    def refresh(self, cell):
+        # Update the cross checks for a cell after something near it changed
+        cells, free = self.cells, (self.EMPTY, self.BORDER)
+        if cells[cell] != self.BORDER:
+            empty = cells[cell] == self.EMPTY
+            self.open_across[cell] = empty and cells[cell - self.STRIDE] in free and cells[cell + self.STRIDE] in free
+            self.open_down[cell] = empty and cells[cell - 1] in free and cells[cell + 1] in free
+
+    def refresh_around(self, cell):
+        for other in (cell, cell - 1, cell + 1, cell - self.STRIDE, cell + self.STRIDE):
+            self.refresh(other)
+
+    def moves(self, word):
+        # All the places word can be played so it crosses at least one word
+        # already on the board, as a list of (x, y, horiz, offsets of the tiles
+        # to lay down).  Only looks at the cells with a matching letter, and 
+        # only returns moves where the tiles we need are still in the bag
+        cells, free = self.cells, (self.EMPTY, self.BORDER)
+        ret, seen = [], set()
+        for off, char in enumerate(word):
+            for anchor in self.anchors.get(char, ()):
+                for horiz in (False, True):
+                    step = 1 if horiz else self.STRIDE
+                    crossable = self.open_across if horiz else self.open_down
+                    start = anchor - off * step
+                    if (start, horiz) in seen:
+                        continue
+                    seen.add((start, horiz))
+                    x, y = start % self.STRIDE - 1, start // self.STRIDE - 1
+                    if not (0 <= x < self.SIZE and 0 <= y < self.SIZE):
+                        continue
+
+                    # The word needs space before and after it, and each letter either
+                    # matches the board or goes in a cell that can take a new tile
+                    if cells[start - step] not in free:
+                        continue
+                    laid, cell = [], start
+                    for i, cur in enumerate(word):
+                        if cells[cell] == self.EMPTY:
+                            if not crossable[cell]:
+                                break
+                            laid.append(i)
+                        elif cells[cell] != ord(cur):
+                            break
+                        cell += step
+                    else:
+                        if cells[cell] in free and len(laid) > 0:
+                            if all(self.bag[BAG_SLOTS.index(letter)] >= count for letter, count in Counter(word[i] for i in laid).items()):
+                                ret.append((x, y, horiz, tuple(laid)))
+        return ret
+
+    def apply(self, word, x, y, horiz):
+        # Play a word on the board, taking the tiles we lay down out of the bag
+        step = 1 if horiz else self.STRIDE
+        start = self.index(x, y)
+        laid = []
+        for off, char in enumerate(word):
+            cell = start + off * step
+            if self.cells[cell] == self.EMPTY:
+                self.cells[cell] = ord(char)
+                self.bag[BAG_SLOTS.index(char)] -= 1
+                self.anchors[char].add(cell)
+                laid.append(off)
+            elif self.cells[cell] != ord(char):
+                raise Exception("Word doesn't fit on the board")
+        for off in laid:
+            self.refresh_around(start + off * step)
+        self.played.append((word, x, y, horiz, tuple(laid)))
+
+    def undo(self):
+        # Take back the last word played
+        word, x, y, horiz, laid = self.played.pop()
+        step = 1 if horiz else self.STRIDE
+        start = self.index(x, y)
+        for off in laid:
+            self.cells[start + off * step] = self.EMPTY
+            self.bag[BAG_SLOTS.index(word[off])] += 1
+            self.anchors[word[off]].discard(start + off * step)
+        for off in laid:
+            self.refresh_around(start + off * step)
+
+    def to_dict(self):
+        # The board as a dict of (x, y) to letter
+        return {(x, y): self.get(x, y) for x, y in enum_xy(self.SIZE, self.SIZE)}
+
+    def rows(self):
+        # The board as a list of strings, one per row
+        return ["".join(self.get(x, y) for x in range(self.SIZE)) for y in range(self.SIZE)]
+
+# The premium squares on the board, and the value of each tile
+SPECIAL_CELLS = {
+    (0, 0): 'TW', (0, 3): 'DL', (0, 7): 'TW', (0, 11): 'DL', (0, 14): 'TW', (1, 1): 'DW', 
+    (1, 5): 'TL', (1, 9): 'TL', (1, 13): 'DW', (2, 2): 'DW', (2, 6): 'DL', (2, 8): 'DL', 
+    (2, 12): 'DW', (3, 0): 'DL', (3, 3): 'DW', (3, 7): 'DL', (3, 11): 'DW', (3, 14): 'DL', 
+    (4, 4): 'DW', (4, 10): 'DW', (5, 1): 'TL', (5, 5): 'TL', (5, 9): 'TL', (5, 13): 'TL', 
+    (6, 2): 'DL', (6, 6): 'DL', (6, 8): 'DL', (6, 12): 'DL', (7, 0): 'TW', (7, 3): 'DL', 
+    (7, 7): 'DW', (7, 11): 'DL', (7, 14): 'TW', (8, 2): 'DL', (8, 6): 'DL', (8, 8): 'DL', 
+    (8, 12): 'DL', (9, 1): 'TL', (9, 5): 'TL', (9, 9): 'TL', (9, 13): 'TL', (10, 4): 'DW', 
+    (10, 10): 'DW', (11, 0): 'DL', (11, 3): 'DW', (11, 7): 'DL', (11, 11): 'DW', 
+    (11, 14): 'DL', (12, 2): 'DW', (12, 6): 'DL', (12, 8): 'DL', (12, 12): 'DW', 
+    (13, 1): 'DW', (13, 5): 'TL', (13, 9): 'TL', (13, 13): 'DW', (14, 0): 'TW', 
+    (14, 3): 'DL', (14, 7): 'TW', (14, 11): 'DL', (14, 14): 'TW',
+}
+TILE_VALUES = {
+    'A': 1, 'B': 3, 'C': 3, 'D': 2, 'E': 1, 'F': 4, 'G': 2, 'H': 4, 'I': 1, 'J': 8, 'K': 5, 
+    'L': 1, 'M': 3, 'N': 1, 'O': 1, 'P': 3, 'Q': 10, 'R': 1, 'S': 1, 'T': 1, 'U': 1, 'V': 4, 
+    'W': 4, 'X': 8, 'Y': 4, 'Z': 10, '*': 0
+}
+
+# The same as above, but as flat lists to avoid building tuples and doing dict
+# lookups while scoring.  The multipliers are indexed like the cells in a Board,
+# and the values by the slots in BAG_SLOTS
+LETTER_MULT = bytes(
+    {"TL": 3, "DL": 2}.get(SPECIAL_CELLS.get((cell % Board.STRIDE - 1, cell // Board.STRIDE - 1)), 1)
+    for cell in range(Board.STRIDE * Board.STRIDE)
+)
+WORD_MULT = bytes(
+    {"TW": 3, "DW": 2}.get(SPECIAL_CELLS.get((cell % Board.STRIDE - 1, cell // Board.STRIDE - 1)), 1)
+    for cell in range(Board.STRIDE * Board.STRIDE)
+)
+SLOT_VALUES = bytes(TILE_VALUES[x] for x in BAG_SLOTS)
+
+def score_word(word, x, y, horiz, laid):
+    # Score one word, laid is the offsets of the tiles laid down to play it,
+    # only those tiles get the benefit of the premium squares under them
+    step = 1 if horiz else Board.STRIDE
+    cell = (x + 1) + (y + 1) * Board.STRIDE
+    points, word_mult = 0, 1
+    for off, char in enumerate(word):
+        value = SLOT_VALUES[BAG_SLOTS.index(char)]
+        if off in laid:
+            value *= LETTER_MULT[cell]
+            word_mult *= WORD_MULT[cell]
+        points += value
+        cell += step
+    return points * word_mult
+
+def score_game(played):
+    # The score for each word played in a game, played is Board.played
+    return [score_word(word, x, y, horiz, laid) for word, x, y, horiz, laid in played]
 
 def show_grid(grid):
     # Just dump out a grid to stdout
@@ -97,38 +399,46 @@ def enum_xy(width, height):
         for y in range(height):
             yield x, y
 
-def find_place(digit, grid, draw_bag, place, word, first_letter, words, cipher):
+def find_place(digit, board, word, first_letter, words, cipher, stats=None):
     # Find the next word, and place it.  This will be called recursively till
-    # we've finished all the letters in word
+    # we've finished all the letters in word.  Returns the board with all of
+    # the words played, or None if we couldn't find a way to play them.  
+    # stats is an optional search_stats.SearchStats to count the work done
 
     if len(word) == 0:
         # We hit the end, go ahead and return the current state as the good state
-        return grid, place
+        return board
 
     # This is the target letters we need in the word
     cur = word[:1]
     target = cipher[TO_ENCODE.index(cur) + digit * len(TO_ENCODE)]
 
     if first_letter:
-        # All the possible words we could play
-        options = [x for x in words if x[2:4] == target and len(x) <= 7]
-        # Now filter down to the ones that have enough letters
-        # left in the draw bag
-        options = [x for x in options if is_in_bag(x, draw_bag)]
+        # All the possible words we could play, that have enough letters left
+        # in the draw bag
+        options = words.feasible(target, 7, board.bag)
+        if stats is not None:
+            stats.node(digit, len(options))
         if len(options):
             # For the first word, just pick something and place it on the center of the board
             random.shuffle(options)
             for picked in options:
-                grid_copy = grid.copy()
-                draw_bag_copy = draw_bag.copy()
-                place_copy = place.copy()
-                place_word(picked, grid_copy, draw_bag_copy, place_copy, 7 - len(picked) // 2, 7, True)
-                ret = find_place(digit + 1, grid_copy, draw_bag_copy, place_copy, word[1:], False, words, cipher)
+                board.apply(picked, 7 - len(picked) // 2, 7, True)
+                ret = find_place(digit + 1, board, word[1:], False, words, cipher, stats)
                 if ret is not None:
                     return ret
+                board.undo()
+                if stats is not None:
+                    stats.backtrack(digit)
     else:
-        # All the possible words we could play
-        options = [x for x in words if x[2:4] == target and len(x) <= 8]
+        # All the possible words we could play.  A word can use tiles already
+        # on the board where it crosses them, so anything that needs more of a
+        # letter than the bag and the board have between them can't be played,
+        # and this drops those in one go before we look for places to play them
+        on_board = "".join(letter * len(cells) for letter, cells in board.anchors.items())
+        options = words.feasible(target, 8, board.bag, on_board)
+        if stats is not None:
+            stats.node(digit, len(options))
 
         if len(options):
             random.shuffle(options)
@@ -137,136 +447,157 @@ def find_place(digit, grid, draw_bag, place, word, first_letter, words, cipher):
             options = options[:10]
 
             for picked in options:
-                # For each word, try to find a place to put i ton the grid
-                for (x, y), val in grid.items():
-                    for off, char in enumerate(picked):
-                        if char == val:
-                            # Ok, this could go on the grid here, but first need to make
-                            # sure it doesn't interfer with something elsewhere on the grid
-                            if is_in_bag(picked, draw_bag, char):
-                                # Try both horiz and veritcal
-                                for dir_x, dir_y, horiz in ((0, 1, False), (1, 0, True)):
-                                    valid = True
-                                    start_x, start_y = x - dir_x * off, y - dir_y * off
-                                    if 0 <= start_x < 15 and 0 <= start_y < 15:
-                                        # And run through each letter, the first and last need to have
-                                        # a space before and after them (or be off the grid)
-                                        # The reset either need to intersect with the same letter, or
-                                        # have a space on either side of them
-                                        cur_x, cur_y = start_x - dir_x, start_y - dir_y
-                                        valid = True
-                                        intersect, laid_down = 0, 0
-                                        for cur in " " + picked + " ":
-                                            if cur == " ":
-                                                # Checking for a space just means we're checking before or after the word
-                                                # make sure it's an empty cell (or outside of the grid)
-                                                if grid.get((cur_x, cur_y), " ") != " ":
-                                                    valid = False
-                                                    break
-                                            elif grid.get((cur_x, cur_y), "#") == " ":
-                                                # Ok, this cell is empty, meaning we'd palce a letter here, make sure the cells on either side
-                                                # are empty (note the swap of dir_x and dir_y, we want to go to the side, not the direction of the word)
-                                                if grid.get((cur_x - dir_y, cur_y - dir_x), " ") != " " or grid.get((cur_x + dir_y, cur_y + dir_x), " ") != " ":
-                                                    valid = False
-                                                    break
-                                                laid_down += 1
-                                            elif grid.get((cur_x, cur_y), "#") == cur:
-                                                # This means this cell already has the letter we want from the word, so it's good
-                                                intersect += 1
-                                            else:
-                                                # Some other scenario means we can't place this word here
-                                                valid = False
-                                                break
-                                            cur_x, cur_y = cur_x + dir_x, cur_y + dir_y
-
-                                        if valid and laid_down > 0:
-                                            # If the word looks good and we actually have to place letters to play it
-                                            # go ahead and copy our state, and try the next letter
-                                            grid_copy = grid.copy()
-                                            draw_bag_copy = draw_bag.copy()
-                                            place_copy = place.copy()
-                                            place_word(picked, grid_copy, draw_bag_copy, place_copy, start_x, start_y, horiz)
-                                            ret = find_place(digit + 1, grid_copy, draw_bag_copy, place_copy, word[1:], False, words, cipher)
-                                            if ret is not None:
-                                                # If we get here, that means the recursive call finally worked, so return the result
-                                                return ret
-            
-
-def decode_grid(grid, cipher):
-    # Rather simple worker to run through, find all the words of the grid, get their cipher value, and
-    # build up the return word
+                # For each word, try each place it can cross what's already on the board
+                moves = board.moves(picked)
+                if HIGH_SCORES:
+                    # Try the best scoring moves first, so the game looks more like
+                    # two people trying to win
+                    moves.sort(key=lambda x: -score_word(picked, *x))
+                for x, y, horiz, _ in moves:
+                    board.apply(picked, x, y, horiz)
+                    ret = find_place(digit + 1, board, word[1:], False, words, cipher, stats)
+                    if ret is not None:
+                        # If we get here, that means the recursive call finally worked, so return the result
+                        return ret
+                    board.undo()
+                    if stats is not None:
+                        stats.backtrack(digit)
+
+def cipher_lookup(cipher):
+    # Turn the cipher list into a dict of pair to position, for quick lookups
+    return {pair: i for i, pair in enumerate(cipher)}
+
+def decode_rows(rows, lookup):
+    # Find all the words of four or more letters in each row and column, get their
+    # cipher value, and build up the return word.  rows is a list of strings, one
+    # per row, and lookup is from cipher_lookup
     ret = {}
-    for (x, y), val in grid.items():
-        for dir_x, dir_y in ((1, 0), (0, 1)):
-            # Find the start of a four or more letter word
-            if "".join(" " if grid.get((x + off * dir_x, y + off * dir_y), " ") == " " else "." for off in range(-1, 4)) == " ....":
-                # Pull out the target letters for our cipher
-                code = "".join(grid.get((x + off * dir_x, y + off * dir_y), " ") for off in range(2, 4))
+    for line in rows + ["".join(x) for x in zip(*rows)]:
+        for run in line.split(" "):
+            if len(run) >= 4:
+                # The target letters for our cipher are the third and forth letters
+                if run[2:4] not in lookup:
+                    raise Exception(f"The word '{run}' isn't part of the cipher")
                 # Decode the letter, and which one this is
-                code = cipher.index(code)
+                code = lookup[run[2:4]]
                 ret[code // len(TO_ENCODE)] = TO_ENCODE[code % len(TO_ENCODE)]
     return "".join(ret[x] for x in sorted(ret))
 
-def encode(word):
-    draw_bag = {
-        "E": 12, "A": 9, "I": 9, "O": 8, "N": 6,    # 1 point
-        "R": 6, "T": 6, "L": 4, "S": 4, "U": 4,     # 1 point
-        "D": 4, "G": 3,                             # 2 points
-        "B": 2, "C": 2, "M": 2, "P": 2,             # 3 points
-        "F": 2, "H": 2, "V": 2, "W": 2, "Y": 2,     # 4 points
-        "K": 1,                                     # 5 points
-        "J": 1, "X": 1,                             # 8 points
-        "Q": 1, "Z": 1,                             # 10 points
-        "*": 2,                                     # 0 points
-    }
-    special_cells = {
-        (0, 0): 'TW', (0, 3): 'DL', (0, 7): 'TW', (0, 11): 'DL', (0, 14): 'TW', (1, 1): 'DW', 
-        (1, 5): 'TL', (1, 9): 'TL', (1, 13): 'DW', (2, 2): 'DW', (2, 6): 'DL', (2, 8): 'DL', 
-        (2, 12): 'DW', (3, 0): 'DL', (3, 3): 'DW', (3, 7): 'DL', (3, 11): 'DW', (3, 14): 'DL', 
-        (4, 4): 'DW', (4, 10): 'DW', (5, 1): 'TL', (5, 5): 'TL', (5, 9): 'TL', (5, 13): 'TL', 
-        (6, 2): 'DL', (6, 6): 'DL', (6, 8): 'DL', (6, 12): 'DL', (7, 0): 'TW', (7, 3): 'DL', 
-        (7, 7): 'DW', (7, 11): 'DL', (7, 14): 'TW', (8, 2): 'DL', (8, 6): 'DL', (8, 8): 'DL', 
-        (8, 12): 'DL', (9, 1): 'TL', (9, 5): 'TL', (9, 9): 'TL', (9, 13): 'TL', (10, 4): 'DW', 
-        (10, 10): 'DW', (11, 0): 'DL', (11, 3): 'DW', (11, 7): 'DL', (11, 11): 'DW', 
-        (11, 14): 'DL', (12, 2): 'DW', (12, 6): 'DL', (12, 8): 'DL', (12, 12): 'DW', 
-        (13, 1): 'DW', (13, 5): 'TL', (13, 9): 'TL', (13, 13): 'DW', (14, 0): 'TW', 
-        (14, 3): 'DL', (14, 7): 'TW', (14, 11): 'DL', (14, 14): 'TW',
-    }
-    tiles_value = {
-        'A': 1, 'B': 3, 'C': 3, 'D': 2, 'E': 1, 'F': 4, 'G': 2, 'H': 4, 'I': 1, 'J': 8, 'K': 5, 
-        'L': 1, 'M': 3, 'N': 1, 'O': 1, 'P': 3, 'Q': 10, 'R': 1, 'S': 1, 'T': 1, 'U': 1, 'V': 4, 
-        'W': 4, 'X': 8, 'Y': 4, 'Z': 10, '*': 0
-    }
-
-    # Create a simple empty grid
-    grid = {(x, y): ' ' for x, y in enum_xy(15, 15)}
+def grid_to_rows(grid):
+    # Turn a grid dict of (x, y) to letter into a list of rows
+    return ["".join(grid.get((x, y), " ") for x in range(15)) for y in range(15)]
 
+def decode_grid(grid, cipher):
+    # Decode a single grid, see decode_grids for doing a lot of them at once
+    return decode_rows(grid_to_rows(grid), cipher_lookup(cipher))
+
+def decode_grids(grids, cipher):
+    # Decode many grids, each can be a grid dict, a Board, or a list of rows
+    lookup = cipher_lookup(cipher)
+    ret = []
+    for grid in grids:
+        if isinstance(grid, Board):
+            grid = grid.rows()
+        elif isinstance(grid, dict):
+            grid = grid_to_rows(grid)
+        ret.append(decode_rows(grid, lookup))
+    return ret
+
+def build_board(word, stats=None):
+    # Run the search for a board that encodes word, returns None if it fails
+    return find_place(0, Board(DRAW_BAG), word, True, get_word_index(), get_common_middle_letters(), stats)
+
+# When each attempt for build_board_parallel started, shared with the workers
+_attempt_started = None
+
+def attempt_init(started):
+    global _attempt_started
+    _attempt_started = started
+
+def attempt_worker(job):
+    # One attempt for build_board_parallel, with its own seed
+    import time
+    global HIGH_SCORES
+    word, i, seed, HIGH_SCORES = job
+    # Wall clock time, so the main process can tell how long this ran for
+    # if it's cancelled
+    _attempt_started[i] = time.time()
+    started = time.perf_counter()
+    random.seed(seed)
+    board = build_board(word)
+    return seed, None if board is None else board.played, time.perf_counter() - started
+
+def build_board_parallel(word, attempts=8, workers=None, seed=0):
+    # Run several differently seeded searches at once, and use whichever
+    # finishes first, cancelling the rest.  Returns the board (or None if every
+    # attempt failed), and the timing for each attempt as a list of 
+    # (seed, status, seconds), status is one of "found", "failed", "cancelled",
+    # or "skipped" for an attempt that was cancelled before it started.  For
+    # a cancelled attempt, seconds is how long it ran before being stopped
+    from multiprocessing import Array, Pool, cpu_count
+    import time
+
+    if attempts < 1:
+        raise Exception("Need at least one attempt")
+
+    # Load the word list before starting the workers so they can share it
+    get_word_index()
+    get_common_middle_letters()
+
+    jobs = [(word, i, seed + i, HIGH_SCORES) for i in range(attempts)]
+    started = Array("d", attempts)
+    timings, board = [], None
+    with Pool(min(workers or cpu_count(), attempts), attempt_init, (started,)) as pool:
+        for job_seed, played, elapsed in pool.imap_unordered(attempt_worker, jobs):
+            timings.append((job_seed, "failed" if played is None else "found", elapsed))
+            if played is not None:
+                board = Board(DRAW_BAG)
+                for word_played, x, y, horiz, _ in played:
+                    board.apply(word_played, x, y, horiz)
+                break
+        # Stop anything still running
+        cancelled = time.time()
+        pool.terminate()
+
+    finished = set(x[0] for x in timings)
+    for _, i, job_seed, _ in jobs:
+        if job_seed not in finished:
+            if started[i] > 0:
+                timings.append((job_seed, "cancelled", cancelled - started[i]))
+            else:
+                timings.append((job_seed, "skipped", 0.0))
+    return board, timings
+
+def encode(word, writer=None, attempts=None):
     # Create the grid
     print("Working...")
-    grid, place = find_place(0, grid, draw_bag, [], word, True, get_words(), get_common_middle_letters())
+    stats = None
+    if attempts is None:
+        # The parallel attempts below run in other processes, so SEARCH_STATS
+        # only counts the work for a single search
+        if SEARCH_STATS:
+            stats = search_stats.SearchStats(word, trace=STATS_TRACE is not None)
+            # Make sure loading the word list doesn't count as search time
+            with stats.phase("load words"):
+                get_word_index()
+                get_common_middle_letters()
+        with search_stats.phase(stats, "search"):
+            board = build_board(word, stats)
+    else:
+        board, timings = build_board_parallel(word, attempts)
+        for seed, status, elapsed in timings:
+            print(f"Attempt with seed {seed}: {status}" + ("" if status == "skipped" else f" after {elapsed:.2f}s"))
+    if board is None:
+        print("Unable to find a board for that word")
+        return
+    grid = board.to_dict()
 
     scores = [0, 0]
     player = 0
-    for step in place:
-        points = 0
-        for tile in step:
-            mult = 1
-            if tile['placed'] and tile['pos'] in special_cells:
-                if special_cells[tile['pos']] == "TL":
-                    mult = 3
-                elif special_cells[tile['pos']] == "DL":
-                    mult = 2
-            points += tiles_value[tile['char']] * mult
-        for tile in step:
-            if tile['placed'] and tile['pos'] in special_cells:
-                if special_cells[tile['pos']] == "TW":
-                    points *= 3
-                elif special_cells[tile['pos']] == "TW":
-                    points *= 2
-
-        pos = f"{step[0]['pos'][0] + 1} by {step[0]['pos'][1] + 1}"
-        horiz = "across" if step[0]['horiz'] else "down"
-        print(f"{scores[0]} / {scores[1]}: Player {player+1} played '{''.join(x['char'] for x in step)}' at {pos} {horiz} for {points} points")
+    for (played, x, y, horiz, _), points in zip(board.played, score_game(board.played)):
+        pos = f"{x + 1} by {y + 1}"
+        horiz = "across" if horiz else "down"
+        print(f"{scores[0]} / {scores[1]}: Player {player+1} played '{played}' at {pos} {horiz} for {points} points")
         scores[player] += points
         player = (player + 1) % 2
 
@@ -274,29 +605,35 @@ def encode(word):
     decoded = decode_grid(grid, get_common_middle_letters())
     print(f"That grid decodes to: {decoded}")
 
-    if os.path.isfile("scrabble_template.html"):
-        dump_webpage(place, decoded)
+    if writer is not None:
+        dump_webpage(board.played, decoded, writer)
+    elif os.path.isfile("scrabble_template.html"):
+        dump_webpage(board.played, decoded)
 
-def dump_webpage(place, decoded):
-    # If a template for the scrabble board exists locally, dump
-    # out the HTML of the board.
-    import json
+    if stats is not None:
+        stats.report()
+        if STATS_TRACE is not None:
+            with open(STATS_TRACE, "wt", newline="", encoding="utf-8") as f:
+                stats.write_trace(f)
 
-    data = []
-    for step in place:
-        x, y = step[0]['pos']
-        horiz = "horiz" if step[0]['horiz'] else "vertical"
-        word = ''.join(x['char'] for x in step)
-        data.append([word, x, y, horiz])
-    
-    with open("scrabble_template.html", "rt", encoding="utf-8") as f:
-        page = f.read()
+def open_writer(path="scrabble_output.html"):
+    # Output for boards, see renderers.PuzzleWriter for the options
+    return renderers.PuzzleWriter(path, "scrabble_template.html", prefix="scrabble")
 
-    page = page.replace("['NEEDED']", json.dumps(data))
-    page = page.replace("DECODED", decoded)
+def describe_words(played):
+    # Turn the words played on a board into a simple list of [word, x, y, direction]
+    return [[word, x, y, "horiz" if horiz else "vertical"] for word, x, y, horiz, _ in played]
 
-    with open("scrabble_output.html", "wt", newline="", encoding="utf-8") as f:
-        f.write(page)
+def dump_webpage(played, decoded, writer=None):
+    # If a template for the scrabble board exists locally, dump
+    # out the HTML of the board.
+    if writer is None:
+        with open_writer() as writer:
+            dump_webpage(played, decoded, writer)
+        return
+
+    data = describe_words(played)
+    writer.write({"words": data, "decoded": decoded}, {"['NEEDED']": json.dumps(data), "DECODED": decoded})
 
 def decode_input():
     print("Enter a grid to decode, enter a single '.' to end input:")
@@ -313,15 +650,135 @@ def decode_input():
     decoded = decode_grid(grid, get_common_middle_letters())
     print(f"That decodes to {decoded}")
 
+def encode_item(word, seed=None):
+    # Library version of encode, returns a dict with the board as a list of
+    # rows, the words played, and the decoded value to double check it
+    if len(word) > MAX_CHARS:
+        raise Exception(f"Word is longer than {MAX_CHARS} characters")
+    if any(x not in TO_ENCODE for x in word):
+        raise Exception(f"Word can only use the characters {TO_ENCODE}")
+    if seed is not None:
+        random.seed(seed)
+    board = build_board(word)
+    if board is None:
+        raise Exception("Unable to find a board for that word")
+    decoded = decode_grids([board], get_common_middle_letters())[0]
+    if decoded != word:
+        raise Exception("We got the wrong value!")
+    return {"board": board.rows(), "words": describe_words(board.played), "decoded": decoded}
+
+def decode_item(rows):
+    # Library version of decode, takes a board as a list of rows
+    rows = [row[:15].ljust(15) for row in rows[:15]]
+    rows += [" " * 15] * (15 - len(rows))
+    return {"decoded": decode_grids([rows], get_common_middle_letters())[0]}
+
+def process_items(items, writer=None):
+    # Run through a stream of jobs, each a dict with an "op" of "encode" (with
+    # a "word", and optionally a "seed") or "decode" (with "rows").  Yields a dict
+    # for each job, with the "id" from the job if there is one.  The word list
+    # is only loaded once for the whole stream
+    for i, item in enumerate(items):
+        ret = {"id": item["id"]} if "id" in item else {}
+        ret["op"] = item.get("op")
+        try:
+            if "error" in item:
+                raise Exception(item["error"])
+            elif ret["op"] == "encode":
+                ret["word"] = item["word"]
+                # Default to a seed based off the position, so runs are repeatable
+                ret.update(encode_item(item["word"], item.get("seed", i)))
+                if writer is not None:
+                    writer.write({"words": ret["words"], "decoded": ret["decoded"]}, 
+                        {"['NEEDED']": json.dumps(ret["words"]), "DECODED": ret["decoded"]})
+            elif ret["op"] == "decode":
+                ret.update(decode_item(item["rows"]))
+            else:
+                raise Exception(f"Unknown op '{ret['op']}'")
+        except Exception as e:
+            ret["error"] = str(e)
+        yield ret
+
+def read_jobs(filenames):
+    # Read JSON lines from each file, or stdin if there aren't any
+    if len(filenames) == 0:
+        filenames = ["-"]
+    for fn in filenames:
+        f = sys.stdin if fn == "-" else open(fn, "rt", encoding="utf-8")
+        try:
+            for row in f:
+                if len(row.strip()):
+                    try:
+                        item = json.loads(row)
+                    except ValueError as e:
+                        item = {"error": f"Invalid JSON: {e}"}
+                    yield item if isinstance(item, dict) else {"error": "Each job must be a JSON object"}
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+def batch_main(args):
+    save_to = None
+    filenames = []
+    for cur in args:
+        if cur.startswith("SAVE_TO="):
+            save_to = cur[8:]
+        else:
+            filenames.append(cur)
+
+    writer = None if save_to is None else open_writer(save_to)
+    try:
+        for result in process_items(read_jobs(filenames), writer):
+            print(json.dumps(result), flush=True)
+    finally:
+        if writer is not None:
+            writer.close()
+
 def main():
-    if len(sys.argv) == 3 and sys.argv[1] == "encode":
-        encode(sys.argv[2])
+    global HIGH_SCORES, SEARCH_STATS, STATS_TRACE
+    if "HIGH_SCORES" in sys.argv:
+        sys.argv.remove("HIGH_SCORES")
+        HIGH_SCORES = True
+    if "SEARCH_STATS" in sys.argv:
+        sys.argv.remove("SEARCH_STATS")
+        SEARCH_STATS = True
+    for cur in sys.argv[:]:
+        if cur.startswith("STATS_TRACE="):
+            # Implies SEARCH_STATS
+            sys.argv.remove(cur)
+            SEARCH_STATS = True
+            STATS_TRACE = cur[12:]
+
+    if len(sys.argv) >= 3 and sys.argv[1] == "encode":
+        save_to, attempts = None, None
+        for cur in sys.argv[3:]:
+            if cur.startswith("SAVE_TO="):
+                save_to = cur[8:]
+            elif cur.startswith("ATTEMPTS="):
+                attempts = int(cur[9:])
+                if attempts < 1:
+                    print("ATTEMPTS needs to be at least 1")
+                    exit(1)
+        if save_to is None:
+            encode(sys.argv[2], attempts=attempts)
+        else:
+            with open_writer(save_to) as writer:
+                encode(sys.argv[2], writer, attempts=attempts)
     elif len(sys.argv) == 2 and sys.argv[1] == "decode":
         decode_input()
+    elif len(sys.argv) >= 2 and sys.argv[1] == "batch":
+        batch_main(sys.argv[2:])
     else:
         print("Usage:")
         print("  encode <x> = Encode a word")
+        print("  encode <x> SAVE_TO=<path> = Encode a word, saving to a .html, .zip, .jsonl, or directory")
+        print("  encode <x> ATTEMPTS=<n> = Encode a word, running n searches at once and using the first to finish")
+        print("  encode <x> HIGH_SCORES = Encode a word, trying the best scoring moves first")
+        print("  encode <x> SEARCH_STATS = Encode a word, showing how much work the search did")
+        print("  encode <x> STATS_TRACE=<path> = Same, also writing the stats and each search step as JSON")
         print("  decode = Decode a grid")
+        print("  batch [files] [SAVE_TO=<path>] = Run JSON lines jobs from files (or stdin), like:")
+        print('    {"op": "encode", "word": "HELLO"} or {"op": "decode", "rows": ["...", ...]}')
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+# Optional counters for the backtracking searches in sudoku.py and scrabble.py,
+# to help see why an encode was slow.  The searches take a stats argument that
+# defaults to None, and only touch it when it's set, so there's next to no
+# cost when this isn't being used
+
+import contextlib, json, time
+
+class SearchStats:
+    # Counts for one encode.  A node is each time the search looks at a state,
+    # a backtrack is each time it takes a move back, and depth is how deep the
+    # search was when it happened.  Candidates are the sizes of the lists of
+    # options the search had to pick from.  If trace is set, each node and
+    # backtrack is also recorded in order to be written out as JSON
+
+    def __init__(self, name, trace=False):
+        self.name = name
+        self.nodes, self.backtracks, self.max_depth = 0, 0, 0
+        self.candidate_lists, self.candidate_total, self.candidate_max = 0, 0, 0
+        self.phases = {}
+        self.events = [] if trace else None
+
+    def node(self, depth, candidates=None):
+        self.nodes += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+        if candidates is not None:
+            self.candidate_lists += 1
+            self.candidate_total += candidates
+            if candidates > self.candidate_max:
+                self.candidate_max = candidates
+        if self.events is not None:
+            self.events.append(("node", depth, candidates))
+
+    def backtrack(self, depth):
+        self.backtracks += 1
+        if self.events is not None:
+            self.events.append(("backtrack", depth, None))
+
+    def phase(self, name):
+        # Time a block of code, adding to the total for name, use with "with"
+        return Phase(self, name)
+
+    def add_time(self, name, elapsed):
+        self.phases[name] = self.phases.get(name, 0) + elapsed
+
+    def summary(self):
+        return {
+            "name": self.name,
+            "nodes": self.nodes,
+            "backtracks": self.backtracks,
+            "max_depth": self.max_depth,
+            "candidate_lists": self.candidate_lists,
+            "avg_candidates": self.candidate_total / self.candidate_lists if self.candidate_lists else 0,
+            "max_candidates": self.candidate_max,
+            "phases": dict(self.phases),
+        }
+
+    def report(self):
+        # Show the summary in a human friendly way
+        summary = self.summary()
+        print(f"Search stats for {summary['name']!r}:")
+        print(f"  {summary['nodes']} nodes, {summary['backtracks']} backtracks, max depth {summary['max_depth']}")
+        if summary["candidate_lists"]:
+            print(f"  Candidates: {summary['avg_candidates']:.1f} on average, {summary['max_candidates']} at most")
+        for name, elapsed in summary["phases"].items():
+            print(f"  {name:<20} {elapsed:8.3f}s")
+
+    def write_trace(self, f):
+        # Write the summary and every event as one line of JSON to an open file
+        data = self.summary()
+        if self.events is not None:
+            data["events"] = [list(x) for x in self.events]
+        f.write(json.dumps(data) + "\n")
+
+def phase(stats, name):
+    # stats.phase(name) when stats is set, otherwise a context manager that
+    # does nothing, so callers don't need a separate path for stats being off
+    if stats is None:
+        return contextlib.nullcontext()
+    return stats.phase(name)
+
+class Phase:
+    # Context manager for SearchStats.phase
+    def __init__(self, stats, name):
+        self.stats, self.name = stats, name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.stats.add_time(self.name, time.perf_counter() - self.started)
@@ -1,12 +1,23 @@
 #!/usr/bin/env python3
 
 import random, sys
+import renderers, search_stats
 
 # All the possible characters we can encode, we start with a null 
 # character to handle less than 8 characters
 CHARS = "\x00 !\"#$%&'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`abcdefghijklmnopqrstuvwxyz{|}~"
 # Optional, spend more time finding the hardest possible puzzle
 HARD_MODE = False
+# How long hard mode can search for each puzzle, and how many removed 
+# cells is good enough to stop early
+HARD_MODE_TIME = 30
+HARD_MODE_TARGET = 40
+# Optional, require every puzzle to have exactly one solution
+UNIQUE_MODE = False
+# Optional, show counts of how much work the search did for each puzzle, and
+# a file to write a JSON line per puzzle with every step the search took
+SEARCH_STATS = False
+STATS_TRACE = None
 
 def header(value):
     # Just dump out a header
@@ -53,50 +64,254 @@ def show_grids(*grids):
     for row in rows:
         print(row)
 
+# Lookup tables so the hot paths don't need to redo the coordinate math.  
+# Cells are numbered x + y * 9
+ROW_OF = tuple(cell // 9 for cell in range(81))
+COL_OF = tuple(cell % 9 for cell in range(81))
+BOX_OF = tuple((cell // 27) * 3 + (cell % 9) // 3 for cell in range(81))
+# All 27 units (rows, columns, then boxes) as tuples of cell indexes
+UNITS = tuple(
+    [tuple(cell for cell in range(81) if ROW_OF[cell] == i) for i in range(9)] +
+    [tuple(cell for cell in range(81) if COL_OF[cell] == i) for i in range(9)] +
+    [tuple(cell for cell in range(81) if BOX_OF[cell] == i) for i in range(9)]
+)
+# The 20 other cells that share a row, column, or box with each cell
+PEERS = tuple(
+    tuple(other for other in range(81) if other != cell and (
+        ROW_OF[other] == ROW_OF[cell] or COL_OF[other] == COL_OF[cell] or BOX_OF[other] == BOX_OF[cell]))
+    for cell in range(81)
+)
+# The cells of each box, in the same order enum_xy walks through them
+BOX_CELLS = tuple(
+    tuple((box_x * 3 + x) + (box_y * 3 + y) * 9 for x, y in enum_xy(3))
+    for box_x, box_y in enum_xy(3)
+)
+# The cells in the diagonal boxes that hold the encoded value, nine for each
+# box from the top left to the bottom right.  These must always have exactly
+# one valid option in a puzzle
+SPECIALS = tuple(x + y * 9 for off in range(0, 9, 3) for x, y in enum_xy(3, off, off))
+# For each cell, the special cells that share a row, column, or box with it
+SPECIAL_PEERS = tuple(tuple(other for other in PEERS[cell] if other in SPECIALS) for cell in range(81))
+
+# Digits are stored as bits 1 through 9 of an int for the bitmask solver, so 
+# a mask of 0b1111111110 means every digit is still possible
+ALL_DIGITS = 0x3FE
+# For each possible mask, the digits it contains
+MASK_DIGITS = tuple(tuple(d for d in range(1, 10) if mask & (1 << d)) for mask in range(1024))
+
 def valid_options(grid, x, y):
     # Return all valid answers for a cell, ignoring the cell itself
-    ret = set(range(1, 10))
-    for check_x in range(9):
-        if check_x != x:
-            ret.discard(grid[check_x + y * 9])
-    for check_y in range(9):
-        if check_y != y:
-            ret.discard(grid[x + check_y * 9])
-    off_x, off_y = (x // 3) * 3, (y // 3) * 3
-    for check_x, check_y in enum_xy(3, off_x, off_y):
-        if (check_x, check_y) != (x, y):
-            ret.discard(grid[check_x + check_y * 9])
-    return ret
-
-def add_solution(grid, cell=0):
-    # Recursive function, tries to add a valid solution and move on the 
-    # next cell.  If a cell has no solution, backtrack and pick another 
-    # solution from a cell with more than one option
-    if cell == 81:
-        # Hit the end, must have found the solution
-        return grid
-    elif grid[cell] == " ":
-        options = valid_options(grid, cell % 9, cell // 9)
-        if len(options) == 0:
-            # Oops, nothing found, backtrack
-            return None
-        else:
+    return set(range(1, 10)).difference([grid[peer] for peer in PEERS[x + y * 9]])
+
+class Solver:
+    # Keeps track of which digits each row, column, and box already uses
+    # as bitmasks, so finding the options for a cell is a few bitwise ops
+    # instead of a rescan.  Moves are recorded on a trail and undone in place
+    # rather than copying the grid for each guess.
+
+    def __init__(self, grid, cell=0, randomize=True, stats=None):
+        self.randomize = randomize
+        self.stats = stats
+        self.cells = [0 if val == ' ' else val for val in grid]
+        self.rows, self.cols, self.boxes = [0] * 9, [0] * 9, [0] * 9
+        self.trail = []
+        self.valid = True
+        for i, val in enumerate(self.cells):
+            if val:
+                bit = 1 << val
+                if (self.rows[ROW_OF[i]] | self.cols[COL_OF[i]] | self.boxes[BOX_OF[i]]) & bit:
+                    # The clues we were given conflict with each other
+                    self.valid = False
+                self.rows[ROW_OF[i]] |= bit
+                self.cols[COL_OF[i]] |= bit
+                self.boxes[BOX_OF[i]] |= bit
+
+        # Only cells at or after the starting cell are filled in, to match
+        # how add_solution has always treated its cell argument
+        self.open = [i for i in range(cell, 81) if not self.cells[i]]
+        skipped = set(i for i in range(cell) if not self.cells[i])
+        self.units = [unit for unit in UNITS if not any(i in skipped for i in unit)]
+
+    def options(self, cell):
+        # Bitmask of the digits that can still go in a cell
+        return ALL_DIGITS & ~(self.rows[ROW_OF[cell]] | self.cols[COL_OF[cell]] | self.boxes[BOX_OF[cell]])
+
+    def place(self, cell, digit):
+        bit = 1 << digit
+        self.cells[cell] = digit
+        self.rows[ROW_OF[cell]] |= bit
+        self.cols[COL_OF[cell]] |= bit
+        self.boxes[BOX_OF[cell]] |= bit
+        self.trail.append(cell)
+
+    def undo(self, mark):
+        # Take back every move made since the trail was mark long
+        while len(self.trail) > mark:
+            cell = self.trail.pop()
+            bit = ~(1 << self.cells[cell])
+            self.cells[cell] = 0
+            self.rows[ROW_OF[cell]] &= bit
+            self.cols[COL_OF[cell]] &= bit
+            self.boxes[BOX_OF[cell]] &= bit
+
+    def propagate(self):
+        # Fill in any forced cells: naked singles (a cell with only one option)
+        # and hidden singles (a digit that only fits one place in a unit).
+        # Returns False if we hit a contradiction
+        cells = self.cells
+        changed = True
+        while changed:
+            changed = False
+            for cell in self.open:
+                if not cells[cell]:
+                    mask = self.options(cell)
+                    if not mask:
+                        return False
+                    if not mask & (mask - 1):
+                        self.place(cell, MASK_DIGITS[mask][0])
+                        changed = True
+
+            for unit in self.units:
+                once, twice, filled = 0, 0, 0
+                for cell in unit:
+                    if cells[cell]:
+                        filled |= 1 << cells[cell]
+                    else:
+                        mask = self.options(cell)
+                        twice |= once & mask
+                        once |= mask
+                if (once | filled) != ALL_DIGITS:
+                    # Some digit has nowhere to go in this unit
+                    return False
+                for digit in MASK_DIGITS[once & ~twice & ~filled]:
+                    bit = 1 << digit
+                    for cell in unit:
+                        if not cells[cell] and self.options(cell) & bit:
+                            self.place(cell, digit)
+                            changed = True
+                            break
+                    else:
+                        # An earlier single in this unit took the only spot
+                        return False
+        return True
+
+    def search(self, depth=0):
+        if not self.propagate():
+            return False
+
+        # Pick the most constrained cell to branch on
+        best, best_options = None, None
+        for cell in self.open:
+            if not self.cells[cell]:
+                options = MASK_DIGITS[self.options(cell)]
+                if best is None or len(options) < len(best_options):
+                    best, best_options = cell, options
+                    if len(options) == 2:
+                        break
+        if best is None:
+            # Nothing left to fill in, this is a solution
+            return True
+        if self.stats is not None:
+            self.stats.node(depth, len(best_options))
+
+        if self.randomize:
             # Try each option, in a random order to prevent bias
-            options = list(options)
-            random.shuffle(options)
-            for x in options:
-                temp = grid[:]
-                temp[cell] = x
-                temp = add_solution(temp, cell + 1)
-                if temp is not None:
-                    # If we ran all the way to the end, just
-                    # return what we found
-                    return temp
-    else:
-        # This cell already has something, just use it as is
-        return add_solution(grid, cell+1)
-
-def create_encoded_grid(str):
+            best_options = list(best_options)
+            random.shuffle(best_options)
+        mark = len(self.trail)
+        for digit in best_options:
+            self.place(best, digit)
+            if self.search(depth + 1):
+                return True
+            self.undo(mark)
+            if self.stats is not None:
+                self.stats.backtrack(depth)
+        return False
+
+    def solve(self):
+        # Returns the solved grid, or None if there isn't a solution
+        if self.valid and self.search():
+            return [' ' if val == 0 else val for val in self.cells]
+        return None
+
+def add_solution(grid, cell=0, stats=None):
+    # Fill in every empty cell from cell onward with a valid solution, picking
+    # randomly between options so the filled out grid isn't biased.  Returns
+    # None if the grid has no solution
+    return Solver(grid, cell, stats=stats).solve()
+
+# Sudoku as an exact cover problem: picking digit d for a cell is a row that
+# covers four columns, one for the cell itself, and one for d in each of the
+# cell's row, column, and box.  Rows are numbered cell * 9 + (d - 1)
+COVER_ROWS = tuple(
+    (cell, 81 + ROW_OF[cell] * 9 + digit - 1, 162 + COL_OF[cell] * 9 + digit - 1, 243 + BOX_OF[cell] * 9 + digit - 1)
+    for cell in range(81) for digit in range(1, 10)
+)
+
+def count_solutions(grid, limit=2):
+    # Count how many solutions a grid has, using Knuth's Algorithm X with
+    # a dict of sets standing in for the dancing links.  Stops as soon as
+    # it finds limit solutions, so the default is enough to tell if a 
+    # puzzle has a unique solution
+
+    # The clues are already placed, so only build the columns they don't cover,
+    # and the rows that don't clash with them
+    state = Solver(grid, randomize=False)
+    if not state.valid:
+        return 0
+    columns = {}
+    for cell in state.open:
+        columns[cell] = set()
+    for i in range(9):
+        for digit in MASK_DIGITS[ALL_DIGITS & ~state.rows[i]]:
+            columns[81 + i * 9 + digit - 1] = set()
+        for digit in MASK_DIGITS[ALL_DIGITS & ~state.cols[i]]:
+            columns[162 + i * 9 + digit - 1] = set()
+        for digit in MASK_DIGITS[ALL_DIGITS & ~state.boxes[i]]:
+            columns[243 + i * 9 + digit - 1] = set()
+    for cell in state.open:
+        for digit in MASK_DIGITS[state.options(cell)]:
+            row = cell * 9 + digit - 1
+            for col in COVER_ROWS[row]:
+                columns[col].add(row)
+
+    def select(row):
+        # Remove every row that clashes with this one, and the columns it covers
+        removed = []
+        for col in COVER_ROWS[row]:
+            for other in columns[col]:
+                for other_col in COVER_ROWS[other]:
+                    if other_col != col:
+                        columns[other_col].remove(other)
+            removed.append(columns.pop(col))
+        return removed
+
+    def deselect(row, removed):
+        # Exactly undo select, in reverse order
+        for col in reversed(COVER_ROWS[row]):
+            columns[col] = removed.pop()
+            for other in columns[col]:
+                for other_col in COVER_ROWS[other]:
+                    if other_col != col:
+                        columns[other_col].add(other)
+
+    def search():
+        if not columns:
+            return 1
+        # Branch on the column with the fewest ways to cover it
+        col = min(columns, key=lambda x: len(columns[x]))
+        found = 0
+        for row in list(columns[col]):
+            removed = select(row)
+            found += search()
+            deselect(row, removed)
+            if found >= limit:
+                break
+        return found
+
+    return min(search(), limit)
+
+def create_encoded_grid(str, stats=None):
     if len(str) > 8: raise Exception("String is too long")
 
     # Covert the string into a single number
@@ -107,33 +322,33 @@ def create_encoded_grid(str):
 
     # Create a Sudoku grid based off that value
     grid = [" "] * 81
-    for off in range(3):
+    for off in range(0, 27, 9):
         # Fill diagonal squares, since they don't impact each other 
         # we can fill them with any permutation of digits
         numbers = list(range(1, 10))
-        for x, y in enum_xy(3):
+        for cell in SPECIALS[off:off + 9]:
             # We have len(numbers) possible for this cell, so
             # pick the number based off of that
             temp = val % len(numbers)
             val //= len(numbers)
             # Store the value in the grid
-            grid[x + off * 3 + (y + off * 3) * 9] = numbers.pop(temp)
+            grid[cell] = numbers.pop(temp)
 
     # And find a solution for the remaining cells, any solution
     # will do as there will likely be multiple options
-    return add_solution(grid, 0)
+    return add_solution(grid, 0, stats)
 
 def decode_grid(grid):
     # Opposite logic of create_encoded_grid
 
     mul, val = 1, 0
     # Run through the three diagonal squares
-    for off in range(0, 9, 3):
+    for off in range(0, 27, 9):
         numbers = list(range(1, 10))
-        for x, y in enum_xy(3, off, off):
+        for cell in SPECIALS[off:off + 9]:
             # Figure out the index of this cell from our list
             # of possible numbers
-            temp = numbers.index(grid[x + y * 9])
+            temp = numbers.index(grid[cell])
             # That gets placed in the final number, and our multipler moved up
             val += temp * mul
             mul *= len(numbers)
@@ -150,49 +365,170 @@ def decode_grid(grid):
     # short strings here
     return decoded.split("\x00")[0]
 
-def create_worker(worker_id, grid, lock, global_best, global_grid):
-    import time
+def grids_to_array(grids):
+    # Turn a list of grids into an (N, 81) NumPy array, with 0 for empty cells
+    import numpy as np
+    return np.array([[0 if cell == ' ' else cell for cell in grid] for grid in grids], dtype=np.int64).reshape(-1, 81)
+
+def audit_grids(solutions, puzzles=None):
+    # Check and decode a whole batch of grids at once.  solutions is an (N, 81)
+    # array of solved grids, puzzles an optional (N, 81) array of the matching
+    # puzzles with 0 for removed cells.  Returns a dict of:
+    #   valid   - True for each solution that's a correctly solved Sudoku
+    #   decoded - The hidden string in each solution, None for invalid ones
+    #   clues   - How many clues each puzzle has
+    #   matches - True where every clue in the puzzle agrees with the solution
+    import numpy as np
+
+    solutions = np.asarray(solutions, dtype=np.int64).reshape(-1, 81)
+    count = solutions.shape[0]
+
+    # Every row, column, and box needs each digit exactly once, which is 
+    # the same as the bits for the 9 cells OR'ing together to all 9 digits
+    in_range = ((solutions >= 1) & (solutions <= 9)).all(axis=1)
+    bits = np.left_shift(1, solutions.clip(0, 10))
+    units = np.bitwise_or.reduce(bits[:, np.array(UNITS)], axis=2)
+    valid = in_range & (units == ALL_DIGITS).all(axis=1)
+
+    # Same logic as decode_grid: each cell in a diagonal box is the index of
+    # its digit in the list of digits not already used earlier in the box,
+    # which is just how many unused digits are smaller than it
+    vals = solutions[:, np.array(SPECIALS)].reshape(count, 3, 9)
+    earlier = np.tri(9, 9, -1, dtype=bool)
+    smaller = (vals[:, :, None, :] < vals[:, :, :, None]) & earlier
+    index = (vals - 1 - smaller.sum(axis=3)).reshape(count, 27)
+    # The multiplier for each cell is the product of the number of choices
+    # for every cell before it
+    sizes = np.tile(np.arange(9, 0, -1, dtype=np.int64), 3)
+    muls = np.concatenate(([1], np.cumprod(sizes)[:-1]))
+    val = (index * muls).sum(axis=1)
+
+    codes = np.empty((count, 8), dtype=np.int64)
+    for i in range(8):
+        codes[:, i] = val % len(CHARS)
+        val //= len(CHARS)
+    chars = np.frombuffer(CHARS.encode("ascii"), dtype=np.uint8)[codes]
+    decoded = [
+        row.tobytes().split(b"\x00")[0].decode("ascii") if ok else None
+        for row, ok in zip(chars, valid)
+    ]
+
+    ret = {"valid": valid, "decoded": decoded}
+    if puzzles is not None:
+        puzzles = np.asarray(puzzles, dtype=np.int64).reshape(-1, 81)
+        ret["clues"] = (puzzles != 0).sum(axis=1)
+        ret["matches"] = ((puzzles == 0) | (puzzles == solutions)).all(axis=1)
+    return ret
 
-    # Make sure this worker works on a different set than other workers
-    random.seed(worker_id)
+def search_worker(job):
+    # One short burst of hill climbing for PuzzleSearch.  Starting from the best
+    # puzzle found so far, put back a few of the removed clues and try to remove
+    # more than we put back
+    solution, puzzle, seed, attempts, unique = job
+    random.seed(seed)
+
+    best = sum(1 if cell == ' ' else 0 for cell in puzzle)
+    for _ in range(attempts):
+        test = puzzle[:]
+        removed = [i for i, cell in enumerate(test) if cell == ' ']
+        random.shuffle(removed)
+        for i in removed[:random.randint(1, 4)]:
+            test[i] = solution[i]
+        test = make_single_puzzle(test, unique)
+        removed = sum(1 if cell == ' ' else 0 for cell in test)
+        # Take equally good puzzles too, so the search can wander 
+        # along a plateau instead of getting stuck
+        if removed >= best:
+            best, puzzle = removed, test
+    return best, puzzle
+
+class PuzzleSearch:
+    # A pool of processes that work together to find the puzzle with the
+    # most removed cells.  Each job starts from the best puzzle any worker has
+    # found so far, and new jobs are handed out till we run out of time or
+    # hit the target.  The pool can be reused for many searches
+
+    def __init__(self, workers=None):
+        from multiprocessing import cpu_count, Pool
+        self.workers = workers or cpu_count()
+        self.pool = Pool(self.workers)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def search(self, grid, time_limit=30, target=40, attempts=20, seed=0, progress=None, unique=False):
+        # Returns the best puzzle found for the solved grid.  If progress is 
+        # passed in, it's called with (removed, elapsed seconds, jobs done)
+        # each time a job finishes
+        import queue, time
+
+        started = time.time()
+        results = queue.Queue()
+        best, puzzle = 0, grid[:]
+        jobs, in_flight = 0, 0
+
+        def submit():
+            nonlocal jobs, in_flight
+            job = (grid, puzzle, f"{seed}:{jobs}", attempts, unique)
+            self.pool.apply_async(search_worker, (job,), callback=results.put, error_callback=results.put)
+            jobs += 1
+            in_flight += 1
+
+        for _ in range(self.workers):
+            submit()
+
+        done = 0
+        while in_flight > 0:
+            result = results.get()
+            in_flight -= 1
+            done += 1
+            if isinstance(result, BaseException):
+                raise result
+            removed, test = result
+            if removed > best:
+                best, puzzle = removed, test
+            if progress is not None:
+                progress(best, time.time() - started, done)
+            if time.time() - started < time_limit and best < target:
+                submit()
 
-    # Our local best hit
-    best, puzzle = 0, None
+        return puzzle
 
-    bail_at = time.time() + 30  # Just try things for 30 seconds
-    bail_hard = 40              # Or, till any worker finds one with 40 removed
+# Shared search pool for HARD_MODE, created the first time it's needed
+_puzzle_search = None
 
-    while time.time() < bail_at and global_best.value < bail_hard:
-        test = make_single_puzzle(grid)
-        removed = sum(1 if cell == ' ' else 0 for cell in test)
-        if removed > best:
-            best, puzzle = removed, test
-            if best > global_best.value:
-                with lock:
-                    if best > global_best.value:
-                        global_best.value = best
-                        for i, val in enumerate(puzzle):
-                            global_grid[i] = 0 if val == ' ' else val
-
-def try_multiple_puzzles(grid):
+def try_multiple_puzzles(grid, stats=None):
     # Run through the puzzle maker worker multiple times, 
-    # finding the hardest possible puzzle
+    # finding the hardest possible puzzle.  In HARD_MODE the puzzles are 
+    # made in other processes, so stats isn't passed on to them, and only
+    # the time taken is counted
 
     best, puzzle = 0, None
     if HARD_MODE:
-        # For hard mode, just try a whole bunch for a while on 
-        # all the cores we have available
-        from multiprocessing import cpu_count, Value, Array, Lock, Process
-        lock = Lock()
-        best_value = Value('i')
-        best_grid = Array('i', [0] * 81)
-        procs = [Process(target=create_worker, args=(i, grid, lock, best_value, best_grid)) for i in range(cpu_count())]
-        [x.start() for x in procs]
-        [x.join() for x in procs]
-        puzzle = [' ' if x == 0 else x for x in best_grid]
+        # For hard mode, search on all the cores we have available, reusing
+        # the same pool for each puzzle
+        global _puzzle_search
+        if _puzzle_search is None:
+            _puzzle_search = PuzzleSearch()
+
+        last = 0
+        def show_progress(removed, elapsed, jobs):
+            nonlocal last
+            if removed > last:
+                last = removed
+                print(f"Found puzzle with {removed} removed cells after {elapsed:.1f}s ({jobs} jobs)")
+
+        puzzle = _puzzle_search.search(grid, time_limit=HARD_MODE_TIME, target=HARD_MODE_TARGET, progress=show_progress, unique=UNIQUE_MODE)
     else:
         for _ in range(100):
-            test = make_single_puzzle(grid)
+            test = make_single_puzzle(grid, UNIQUE_MODE, stats)
             removed = sum(1 if cell == ' ' else 0 for cell in test)
             if removed > best:
                 best, puzzle = removed, test
@@ -202,86 +538,202 @@ def try_multiple_puzzles(grid):
     
     return puzzle
     
-def make_single_puzzle(grid):
+def make_single_puzzle(grid, unique=False, stats=None):
     # Remove some number of cells, ensuring that we never end up with
     # a situation where a cell on the diagonal that we need to worry about
-    # has more than one solution
-
-    # Create a list of cells we can never have more than one solution to
-    specials = []
-    for off in range(0, 9, 3):
-        for x, y in enum_xy(3, off, off):
-            specials.append((x, y))
+    # has more than one solution.  If unique is set, instead make sure the
+    # entire puzzle has exactly one solution, which is slower to check, but
+    # lets far more cells be removed.  For stats, each cell we try to remove
+    # is a node, with the depth being how many cells are already removed
 
     grid = grid[:]
+
+    # For each special cell, count how many of its peers show each digit.  A 
+    # digit is a valid option for the special cell when none of its peers show
+    # it, so removing a clue only needs to update the specials that can see it
+    hits = [[0] * 10 for _ in range(81)]
+    for cell, val in enumerate(grid):
+        if isinstance(val, int):
+            for special in SPECIAL_PEERS[cell]:
+                hits[special][val] += 1
+    options = [0] * 81
+    for special in SPECIALS:
+        options[special] = sum(1 for val in range(1, 10) if hits[special][val] == 0)
+    # How many special cells don't have exactly one option right now
+    ambiguous = sum(1 for special in SPECIALS if options[special] != 1)
+
+    # Keep a list for each box of the cells that still have a clue
+    boxes = [[cell for cell in box if isinstance(grid[cell], int)] for box in BOX_CELLS]
+
     bail = 5
     bail_reset = bail
+    removed = 0
     while bail > 0:
-        # Create a list of boxes and how many cells still have a clue
-        boxes = []
-        for box_x, box_y in enum_xy(3):
-            boxes.append([])
-            for x, y in enum_xy(3):
-                x, y = box_x * 3 + x, box_y * 3 + y
-                if isinstance(grid[x + y * 9], int):
-                    boxes[-1].append(x + y * 9)
-        
         # Get all the boxes with the most number of answers in it
-        boxes.sort(key=lambda x: len(x))
-        boxes = [x for x in boxes if len(x) == len(boxes[-1])]
+        most = max(len(x) for x in boxes)
+        box = random.choice([x for x in boxes if len(x) == most])
 
         # Pull out the cell we'll try to use
-        cell = random.choice(random.choice(boxes))
+        if stats is not None:
+            stats.node(removed, len(box))
+        cell = random.choice(box)
         was_value = grid[cell]
         grid[cell] = ' '
 
-        # And now see if we messed up any of the special values
-        if all(len(valid_options(grid, x, y)) == 1 for x, y in specials):
+        if unique:
+            # Make sure there's still only one way to solve the puzzle
+            with search_stats.phase(stats, "unique check"):
+                valid = count_solutions(grid) == 1
+        else:
+            # And now see if we messed up any of the special values
+            for special in SPECIAL_PEERS[cell]:
+                hits[special][was_value] -= 1
+                if hits[special][was_value] == 0:
+                    options[special] += 1
+                    if options[special] == 2:
+                        ambiguous += 1
+            valid = ambiguous == 0
+
+        if valid:
             # This is all good, reset our bail out
+            box.remove(cell)
             bail = bail_reset
+            removed += 1
         else:
-            # Oops, this breaks one of the special cells, go ahead and revert it
+            # Oops, this breaks the puzzle, go ahead and revert it
             grid[cell] = was_value
+            if not unique:
+                for special in SPECIAL_PEERS[cell]:
+                    hits[special][was_value] += 1
+                    if hits[special][was_value] == 1:
+                        options[special] -= 1
+                        if options[special] == 1:
+                            ambiguous -= 1
             bail -= 1
+            if stats is not None:
+                stats.backtrack(removed)
 
     return grid
 
-def write_html(grid):
-    import json
-    with open("sudoku_template.html", "rt", encoding="utf-8") as f:
-        page = f.read()
-    
-    page = page.replace("['NEEDED']", json.dumps(grid))
+def open_writer(path="sudoku_output.html"):
+    # Output for puzzles, see renderers.PuzzleWriter for the options
+    return renderers.PuzzleWriter(path, "sudoku_template.html", prefix="sudoku")
 
-    with open("sudoku_output.html", "wt", newline="", encoding="utf-8") as f:
-        f.write(page)
+def write_html(grid, writer=None):
+    import json
+    if writer is None:
+        with open_writer() as writer:
+            write_html(grid, writer)
+    else:
+        writer.write({"puzzle": grid}, {"['NEEDED']": json.dumps(grid)})
 
-def create_and_decode(value, create_html=False):
+def encode_value(value, stats=None):
     # Start off making a encoded grid, this will 
-    # only have 3 squares of 9 cells filled out
-    grid = create_encoded_grid(value)
-    # Add the solution to the grid
-    grid = add_solution(grid)
+    # only have 3 squares of 9 cells filled out.  stats is an
+    # optional search_stats.SearchStats to count the work done
+    with search_stats.phase(stats, "fill"):
+        grid = create_encoded_grid(value, stats)
+        # Add the solution to the grid
+        grid = add_solution(grid, stats=stats)
 
     # Remove cells till we have a puzzle
-    grid = try_multiple_puzzles(grid)
+    with search_stats.phase(stats, "make puzzle"):
+        puzzle = try_multiple_puzzles(grid, stats)
+
     # Now we have a puzzle that can be solved, but 
     # doesn't directly have the decoded value
     # in it anymore, so solve it
+    with search_stats.phase(stats, "solve"):
+        solved_grid = add_solution(puzzle, stats=stats)
+    return puzzle, solved_grid, decode_grid(solved_grid)
+
+def create_and_decode(value, writer=None, trace=None):
+    # Encode and show a value, trace is an open file to write
+    # the search stats to when SEARCH_STATS is on
+    stats = None
+    if SEARCH_STATS:
+        stats = search_stats.SearchStats(value, trace=trace is not None)
+    grid, solved_grid, decoded = encode_value(value, stats)
     removed = sum(1 for x in grid if x == ' ')
     header(f"Grid with {removed} removed cells, and solved puzzle")
-    solved_grid = add_solution(grid)
     show_grids(grid, "--->", solved_grid)
-    if create_html:
-        write_html(grid)
+    if writer is not None:
+        write_html(grid, writer)
     header("Hidden string")
-    decoded = decode_grid(solved_grid)
     print(decoded)
     print("")
+    if stats is not None:
+        stats.report()
+        print("")
+        if trace is not None:
+            stats.write_trace(trace)
 
     if decoded != value:
         raise Exception("We got the wrong value!")
 
+def batch_worker(job):
+    # Encode one item for run_batch.  Each item gets its own seed based off
+    # its position, so the output doesn't depend on which worker ran it
+    index, value, seed, unique = job
+    # The worker might not have the same globals as the main process
+    global UNIQUE_MODE
+    UNIQUE_MODE = unique
+    random.seed(f"{seed}:{index}")
+    try:
+        puzzle, solved_grid, decoded = encode_value(value)
+        if decoded != value:
+            raise Exception("We got the wrong value!")
+    except Exception as e:
+        return {"input": value, "error": str(e)}
+    return {"input": value, "puzzle": puzzle, "solution": solved_grid, "decoded": decoded}
+
+def run_batch(values, workers=None, seed=42, max_in_flight=None):
+    # Encode each value from an iterable across a pool of processes, yielding
+    # the results in the same order as the input.  Only a limited number
+    # of items are handed to the pool at once, so a huge input doesn't
+    # all end up in memory
+    from collections import deque
+    from multiprocessing import Pool, cpu_count
+
+    if HARD_MODE:
+        # Hard mode already uses every core for each item
+        raise Exception("HARD_MODE can't be used with batch mode")
+
+    workers = workers or cpu_count()
+    max_in_flight = max_in_flight or workers * 4
+    with Pool(workers) as pool:
+        pending = deque()
+        for index, value in enumerate(values):
+            pending.append(pool.apply_async(batch_worker, ((index, value, seed, UNIQUE_MODE),)))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+def read_batch_input(filenames):
+    # Pull out each newline delimited string to encode, from stdin if there
+    # are no filenames
+    if len(filenames) == 0:
+        filenames = ["-"]
+    for fn in filenames:
+        f = sys.stdin if fn == "-" else open(fn, "rt", encoding="utf-8")
+        try:
+            for row in f:
+                row = row.rstrip("\r\n")
+                if len(row):
+                    yield row
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+def batch_main(filenames, workers=None, writer=None):
+    # Stream out each result as a line of JSON
+    import json
+    for result in run_batch(read_batch_input(filenames), workers=workers):
+        print(json.dumps(result), flush=True)
+        if writer is not None and "puzzle" in result:
+            write_html(result["puzzle"], writer)
+
 def decode_input():
     print("Enter a new line to end input")
     import re
@@ -308,7 +760,8 @@ def decode_input():
 
 def main():
     random.seed(42) # Not necessary, but makes runs consistent, so useful for debugging
-    create_html = False
+    output = None
+    batch, workers = False, None
 
     if len(sys.argv) > 1:
         to_test = []
@@ -316,14 +769,42 @@ def main():
             if cur == "HARD_MODE":
                 global HARD_MODE
                 HARD_MODE = True
+            elif cur.startswith("HARD_TIME="):
+                global HARD_MODE_TIME
+                HARD_MODE_TIME = float(cur[10:])
+            elif cur.startswith("HARD_TARGET="):
+                global HARD_MODE_TARGET
+                HARD_MODE_TARGET = int(cur[12:])
+            elif cur == "UNIQUE_MODE":
+                global UNIQUE_MODE
+                UNIQUE_MODE = True
+            elif cur == "SEARCH_STATS":
+                global SEARCH_STATS
+                SEARCH_STATS = True
+            elif cur.startswith("STATS_TRACE="):
+                # Implies SEARCH_STATS
+                global STATS_TRACE
+                SEARCH_STATS = True
+                STATS_TRACE = cur[12:]
             elif cur == "SAVE_HTML":
-                create_html = True
+                output = "sudoku_output.html"
+            elif cur.startswith("SAVE_TO="):
+                # Save all of the puzzles to a bundle (.zip), a directory, 
+                # or as JSON lines (.jsonl)
+                output = cur[8:]
             elif cur == "decode":
                 # A simple way to decode a grid
                 decode_input()
                 exit(0)
+            elif cur == "batch":
+                # Encode newline delimited strings from files (or stdin), 
+                # outputting JSON lines
+                batch = True
+            elif cur.startswith("WORKERS="):
+                workers = int(cur[8:])
             else:
-                # Allow passing in a string from the command line
+                # Allow passing in a string from the command line, or
+                # the files to read from in batch mode
                 to_test.append(cur)
     else:
         to_test = [
@@ -336,8 +817,19 @@ def main():
             "|-|311()",
         ]
 
-    for value in to_test:
-        create_and_decode(value, create_html=create_html)
+    writer = None if output is None else open_writer(output)
+    trace = None if STATS_TRACE is None else open(STATS_TRACE, "wt", newline="", encoding="utf-8")
+    try:
+        if batch:
+            batch_main(to_test, workers=workers, writer=writer)
+        else:
+            for value in to_test:
+                create_and_decode(value, writer=writer, trace=trace)
+    finally:
+        if writer is not None:
+            writer.close()
+        if trace is not None:
+            trace.close()
 
 if __name__ == "__main__":
     main()
@@ -1,70 +1,655 @@
 #!/usr/bin/env python3
 
-from collections import defaultdict, deque
-from urllib.request import urlretrieve
-import os
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict, defaultdict, deque
+from functools import partial
+import heapq, json, os, struct, sys
+
+# The default word list, five letter words from Knuth
+DEFAULT_WORDS = "sgb-words.txt"
+
+def download_words(fn=DEFAULT_WORDS):
+    # Only the default word list can be downloaded, anything else needs to
+    # already exist
+    if fn == DEFAULT_WORDS and not os.path.isfile(fn):
+        from urllib.request import urlretrieve
+        url = "https://cs.stanford.edu/%7Eknuth/sgb-words.txt"
+        urlretrieve(url, fn)
+    return fn
+
+def read_words(fn):
+    # Read a word list, one word per line, either as plain text or gzip'd if
+    # the name ends with .gz, like the Collins list scrabble.py uses
+    import gzip
+    opener = gzip.open if fn.endswith(".gz") else open
+    with opener(download_words(fn), "rt", encoding="utf-8") as f:
+        for row in f:
+            row = row.strip()
+            if row.startswith('"'):
+                # A JSON lines list of words
+                row = json.loads(row)
+            if len(row):
+                yield row.lower()
+
+# Placeholders, like "o.e" for "one", are stored as numbers rather than
+# strings.  Each letter is a digit from 1 to 26 in base 27, and the
+# placeholder for a position is the word's number with that digit set to 0,
+# which is then hashed down to 64 bits
+PLACEHOLDER_BASE = 27
+
+def is_ladder_word(word):
+    # Only words made of the letters a to z can be used
+    return len(word) > 0 and word.isascii() and word.isalpha() and word.islower()
 
-# Simple helper to return a list of possible place holders
-# for a given word, i.e., (".ne", "o.e", "on." for "one")
 def get_placeholders(word):
-    for i in range(len(word)):
-        yield word[:i] + "." + word[i+1:]
-
-# Load all of the words, putting each word in each possible
-# placeholder for that word
-words = defaultdict(list)
-url = "https://cs.stanford.edu/%7Eknuth/sgb-words.txt"
-fn = "sgb-words.txt"
-if not os.path.isfile(fn):
-    urlretrieve(url, fn)
-with open("sgb-words.txt", "rt") as f:
-    for row in f:
-        row = row.strip()
-        for placeholder in get_placeholders(row):
-            words[placeholder].append(row)
-
-# And now find the ladders for each given pair:
-pairs = [
-    ['stone', 'money'],
-    ['bread', 'crumb'],
-    ['smile', 'giant'],
-    ['apple', 'zebra'],
-    ['other', 'night'],
-    ['bread', 'blood'],
-    ['black', 'white'],
-]
-
-for start_word, end_word in pairs:
-    # Run through a simple A* path finding for going from the start word to
-    # the end word, keeping track of all of the words we use along the way    
-    stack = deque([(start_word, [start_word])])
-    # Don't both using the same word more than once, so track each 
-    # word we've used
-    seen = set()
-
-    while True:
-        if len(stack) == 0:
-            # No path from start to end
-            print("")
-            print(f"{start_word} to {end_word}:")
-            print("No ladder found!")
-            break
+    # The hashes for each placeholder of a word, i.e., (".ne", "o.e", "on."
+    # for "one")
+    value, scale, digits = 0, 1, []
+    for x in word:
+        digit = (ord(x) - 96) * scale
+        value += digit
+        digits.append(digit)
+        scale *= PLACEHOLDER_BASE
+    return [hash(value - x) for x in digits]
+
+class WordList:
+    # A list of words of any lengths.  Only words of the same length can
+    # be next to each other in a ladder, so the words are split up by length,
+    # and the placeholders for a length are only worked out the first time a
+    # word of that length is looked at.  Rather than a dict of lists, for 
+    # each letter position there's a sorted array of placeholder hashes and a 
+    # matching array of which word each one is for, which is a small fraction
+    # of the memory on a big word list
 
-        cur_word, path = stack.pop()
+    def __init__(self, words):
+        self.by_length = defaultdict(list)
+        # All of the words, in the same order they were given
+        self.words = []
+        seen = set()
+        for word in words:
+            if is_ladder_word(word) and word not in seen:
+                seen.add(word)
+                self.words.append(word)
+                self.by_length[len(word)].append(word)
+        self.indexes = {}
+
+    def get_index(self, length):
+        # For each position in words of this length, the sorted placeholder
+        # hashes, and the position of the word in by_length for each
+        if length not in self.indexes:
+            words = self.by_length.get(length, [])
+            placeholders = [get_placeholders(word) for word in words]
+            index = []
+            for pos in range(length):
+                keys = array("q", (x[pos] for x in placeholders))
+                # Sorting is stable, so words with the same placeholder stay
+                # in the same order as the word list
+                order = sorted(range(len(words)), key=keys.__getitem__)
+                index.append((array("q", (keys[i] for i in order)), array("I", order)))
+            # Hashes only can't collide while the numbers fit in 61 bits
+            self.indexes[length] = index, PLACEHOLDER_BASE ** length >= (1 << 61) - 1
+        return self.indexes[length]
+
+    def neighbours(self, word):
+        # All the words that are one letter different from word
+        if not is_ladder_word(word):
+            return
+        index, check = self.get_index(len(word))
+        words = self.by_length[len(word)]
+        for pos, placeholder in enumerate(get_placeholders(word)):
+            keys, ids = index[pos]
+            i = bisect_left(keys, placeholder)
+            while i < len(keys) and keys[i] == placeholder:
+                next_word = words[ids[i]]
+                i += 1
+                if next_word != word:
+                    if check and (next_word[:pos] != word[:pos] or next_word[pos + 1:] != word[pos + 1:]):
+                        continue
+                    yield next_word
+
+def load_words(fn=DEFAULT_WORDS):
+    # Load all of the words from a word list
+    return WordList(read_words(fn))
+
+def make_path(parents, word):
+    # Follow the parent pointers from a word back to the start
+    path = []
+    while word is not None:
+        path.append(word)
+        word = parents[word]
+    return path[::-1]
+
+def search_bfs(neighbours, start_word, end_word):
+    # A breadth first search from the start word to the end word, so the
+    # first ladder found is as short as possible.  Rather than each entry in
+    # the queue carrying its own copy of the path, track the word we came from
+    # for each word we see, and follow that back once we hit the end word.
+    # neighbours is a function that returns the words next to a word.
+    # Returns the ladder as a list of words (or None if there isn't one), and
+    # how many words were expanded to find it
+    parents = {start_word: None}
+    queue = deque([start_word])
+    expanded = 0
+    while len(queue) > 0:
+        cur_word = queue.popleft()
         if cur_word == end_word:
-            # We found the word, dump out the path
-            print("")
-            print(f"{start_word} to {end_word}:")
-            print(f"{len(path)} steps for {start_word} to {end_word}")
-            print(" -> ".join(path))
+            return make_path(parents, cur_word), expanded
+        expanded += 1
+        for next_word in neighbours(cur_word):
+            if next_word not in parents:
+                parents[next_word] = cur_word
+                queue.append(next_word)
+
+    # No path from start to end
+    return None, expanded
+
+def search_bidirectional(neighbours, start_word, end_word):
+    # Same as search_bfs, but search out from both ends at once, one level at a
+    # time, always growing whichever side has the smaller frontier.  The two
+    # searches only need to go about half as deep, which is far fewer words 
+    # on long ladders.  Stopping at the first word both sides have seen still
+    # gives a shortest ladder, since everything closer to either end has
+    # already been seen by that side
+    if start_word == end_word:
+        return [start_word], 0
+    forward, backward = {start_word: None}, {end_word: None}
+    forward_level, backward_level = [start_word], [end_word]
+    expanded = 0
+    while len(forward_level) > 0 and len(backward_level) > 0:
+        grow_forward = len(forward_level) <= len(backward_level)
+        level, parents, other = (forward_level, forward, backward) if grow_forward else (backward_level, backward, forward)
+        next_level = []
+        for cur_word in level:
+            expanded += 1
+            for next_word in neighbours(cur_word):
+                if next_word not in parents:
+                    parents[next_word] = cur_word
+                    if next_word in other:
+                        # The two searches met, join the halves together
+                        return make_path(forward, next_word) + make_path(backward, backward[next_word])[::-1], expanded
+                    next_level.append(next_word)
+        if grow_forward:
+            forward_level = next_level
+        else:
+            backward_level = next_level
+
+    # The searches ran out of words without meeting
+    return None, expanded
+
+def hamming(word, other):
+    # How many letters are different between two words, every step of a
+    # ladder changes one letter, so this is never more than the steps left
+    return sum(1 for a, b in zip(word, other) if a != b)
+
+def search_astar(neighbours, start_word, end_word, distance=hamming):
+    # An A* search, always expanding the word with the fewest steps so far
+    # plus the fewest steps it could possibly still need, as given by 
+    # distance.  Since the estimate never overshoots, the first ladder found
+    # is as short as possible, but words heading away from the end word are
+    # put off, so far fewer words are expanded than a plain BFS.  Ties go to
+    # the word furthest along, since it's closest to finishing
+    steps = {start_word: 0}
+    parents = {start_word: None}
+    # Entries are (estimated total, -steps so far, count, word), the count
+    # keeps the order stable for words that tie
+    heap = [(distance(start_word, end_word), 0, 0, start_word)]
+    count, expanded = 1, 0
+    while len(heap) > 0:
+        _, cur_steps, _, cur_word = heapq.heappop(heap)
+        cur_steps = -cur_steps
+        if cur_steps > steps[cur_word]:
+            # We already found a shorter way here
+            continue
+        if cur_word == end_word:
+            return make_path(parents, cur_word), expanded
+        expanded += 1
+        for next_word in neighbours(cur_word):
+            if next_word not in steps or cur_steps + 1 < steps[next_word]:
+                steps[next_word] = cur_steps + 1
+                parents[next_word] = cur_word
+                heapq.heappush(heap, (cur_steps + 1 + distance(next_word, end_word), -(cur_steps + 1), count, next_word))
+                count += 1
+
+    # No path from start to end
+    return None, expanded
+
+def search_k_shortest(neighbours, start_word, end_word, k, search=search_astar):
+    # Yen's algorithm for the k shortest ladders that don't visit a word more
+    # than once.  Each new ladder is found by taking a ladder we already have,
+    # keeping its start, and searching for a different way from each word
+    # along it, with the steps the known ladders take from there blocked 
+    # off.  search is any of the search functions.  Returns the ladders, 
+    # shortest first, and how many words were expanded in all
+    path, expanded = search(neighbours, start_word, end_word)
+    if path is None:
+        return [], expanded
+    ret, seen = [path], set([tuple(path)])
+    candidates, count = [], 0
+    while len(ret) < k:
+        last = ret[-1]
+        for i in range(len(last) - 1):
+            spur_word, root = last[i], last[:i + 1]
+            # Don't reuse the words before here, or the next step of any
+            # ladder we have that starts the same way.  Steps are blocked in
+            # both directions so searches that work back from the end word
+            # can't use them either
+            blocked_words = set(root[:-1])
+            blocked_steps = set(x[i + 1] for x in ret if x[:i + 1] == root)
+            def spur_neighbours(word):
+                for next_word in neighbours(word):
+                    if next_word in blocked_words:
+                        continue
+                    if (word == spur_word and next_word in blocked_steps) or (next_word == spur_word and word in blocked_steps):
+                        continue
+                    yield next_word
+            spur, spur_expanded = search(spur_neighbours, spur_word, end_word)
+            expanded += spur_expanded
+            if spur is not None:
+                path = root[:-1] + spur
+                if tuple(path) not in seen:
+                    seen.add(tuple(path))
+                    heapq.heappush(candidates, (len(path), count, path))
+                    count += 1
+        if len(candidates) == 0:
+            # There are no more ladders
             break
+        ret.append(heapq.heappop(candidates)[2])
+    return ret, expanded
+
+def mark_changes(path):
+    # Just to make it obvious which letter is changing, upper case the
+    # letter that changed at each step
+    ret = path[:1]
+    for prev_word, word in zip(path, path[1:]):
+        changed = [i for i, (a, b) in enumerate(zip(prev_word, word)) if a != b]
+        ret.append("".join(x.upper() if i in changed else x for i, x in enumerate(word)))
+    return ret
+
+# The different ways to search for a ladder
+SEARCHES = {
+    "bfs": search_bfs,
+    "bidirectional": search_bidirectional,
+    "astar": search_astar,
+}
+
+def find_ladder(words, start_word, end_word, mode="bfs"):
+    # Find a ladder from the start word to the end word, returning the path, 
+    # with the letter that changed at each step in upper case, or None if 
+    # there's no ladder
+    path, _ = SEARCHES[mode](words.neighbours, start_word, end_word)
+    return None if path is None else mark_changes(path)
+
+def find_ladders(words, start_word, end_word, k, mode="astar"):
+    # Find up to k of the shortest ladders from the start word to the end 
+    # word, with the changed letters in upper case like find_ladder
+    paths, _ = search_k_shortest(words.neighbours, start_word, end_word, k, SEARCHES[mode])
+    return [mark_changes(x) for x in paths]
+
+# The index file starts with a header of the magic value, a marker to check
+# the byte order, the number of words, the number of neighbour entries, and
+# the size of the word list, all as native 32-bit ints
+INDEX_MAGIC = b"WLX1"
+INDEX_HEADER = struct.Struct("=4sIIII4x")
+INDEX_BYTE_ORDER = 0x01020304
+
+def build_index(words_fn, index_fn):
+    # Build the graph of words once, and save it so it can be loaded without
+    # parsing the word list or building the placeholders again.  Each word
+    # gets an integer id, based off its position in the word list.  The
+    # neighbours of every word are stored back to back in one array, with 
+    # another array giving where each word's neighbours start, so the 
+    # neighbours of word i are neighbours[offsets[i]:offsets[i + 1]]
+    words = load_words(words_fn)
+    order = words.words
+    ids = {word: i for i, word in enumerate(order)}
+
+    offsets, neighbours = array("I", [0]), array("I")
+    for word in order:
+        neighbours.extend(ids[x] for x in words.neighbours(word))
+        offsets.append(len(neighbours))
+    blob = "\n".join(order).encode("utf-8")
+
+    save_file(index_fn, [
+        INDEX_HEADER.pack(INDEX_MAGIC, INDEX_BYTE_ORDER, len(order), len(neighbours), len(blob)),
+        offsets.tobytes(),
+        neighbours.tobytes(),
+        blob,
+    ])
+
+def save_file(fn, chunks):
+    # Save chunks of bytes to fn, by way of a temp file in the same directory
+    # that's named uniquely for this process.  A half written file is never
+    # loaded, and processes building the same index at once don't write into
+    # each other's temp file
+    import tempfile
+    fd, temp_fn = tempfile.mkstemp(prefix=os.path.basename(fn) + ".", suffix=".tmp", dir=os.path.dirname(os.path.abspath(fn)))
+    try:
+        # Files from mkstemp start out owner only, apply the umask the way
+        # open would, so other users of the checkout can read the index
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_fn, 0o666 & ~umask)
+        with open(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(temp_fn, fn)
+    except BaseException:
+        os.unlink(temp_fn)
+        raise
+
+class LadderIndex:
+    # A word graph saved by build_index.  The file is memory mapped, so the 
+    # neighbour arrays are used directly from the file rather than being read
+    # into Python objects, only the list of words themselves is loaded
+
+    def __init__(self, fn, max_trees=32):
+        import mmap
+        self.fn = fn
+        self.file = open(fn, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, byte_order, count, edges, blob = INDEX_HEADER.unpack_from(self.data, 0)
+        if magic != INDEX_MAGIC or byte_order != INDEX_BYTE_ORDER:
+            self.close()
+            raise Exception(f"{fn} isn't a word ladder index for this platform")
+        self.view = memoryview(self.data)
+        pos = INDEX_HEADER.size
+        self.offsets = self.view[pos:pos + (count + 1) * 4].cast("I")
+        pos += (count + 1) * 4
+        self.neighbour_ids = self.view[pos:pos + edges * 4].cast("I")
+        pos += edges * 4
+        self.words = bytes(self.view[pos:pos + blob]).decode("utf-8").split("\n") if count else []
+        self.ids = {word: i for i, word in enumerate(self.words)}
+        self.labels = None
+        # The most recently used search trees, by the id of the word they start from
+        self.trees = OrderedDict()
+        self.max_trees = max_trees
+
+    def neighbours(self, word_id):
+        # The ids of the words next to a word, as a list rather than a view of
+        # the memory map, so nothing a caller holds on to can stop close
+        return self.neighbour_ids[self.offsets[word_id]:self.offsets[word_id + 1]].tolist()
+
+    def get_id(self, word):
+        if word not in self.ids:
+            raise Exception(f"'{word}' isn't in the word list")
+        return self.ids[word]
+
+    def components(self):
+        # Label each word with the connected component it's in, two words
+        # only have a ladder between them if they have the same label.  The 
+        # labels are saved next to the index, so this only runs once
+        if self.labels is None:
+            fn = self.fn + ".components"
+            labels = array("i")
+            if os.path.isfile(fn):
+                with open(fn, "rb") as f:
+                    labels.frombytes(f.read())
+            if len(labels) != len(self.words):
+                labels = array("i", [-1]) * len(self.words)
+                label = 0
+                for start in range(len(self.words)):
+                    if labels[start] < 0:
+                        # A new component, find everything we can reach from here
+                        labels[start] = label
+                        queue = deque([start])
+                        while len(queue) > 0:
+                            for next_id in self.neighbours(queue.popleft()):
+                                if labels[next_id] < 0:
+                                    labels[next_id] = label
+                                    queue.append(next_id)
+                        label += 1
+                save_file(fn, [labels.tobytes()])
+            self.labels = labels
+        return self.labels
+
+    def connected(self, start_word, end_word):
+        # Is there any ladder between two words?
+        labels = self.components()
+        return labels[self.get_id(start_word)] == labels[self.get_id(end_word)]
+
+    def tree(self, start_id):
+        # A breadth first search from one word to every word it can reach.
+        # Returns the distance to each word (-1 if it can't be reached) and 
+        # the word before it on a shortest ladder (-1 for none), both by id
+        if start_id in self.trees:
+            self.trees.move_to_end(start_id)
+            return self.trees[start_id]
+        distances = array("i", [-1]) * len(self.words)
+        parents = array("i", [-1]) * len(self.words)
+        distances[start_id] = 0
+        queue = deque([start_id])
+        while len(queue) > 0:
+            cur_id = queue.popleft()
+            for next_id in self.neighbours(cur_id):
+                if distances[next_id] < 0:
+                    distances[next_id] = distances[cur_id] + 1
+                    parents[next_id] = cur_id
+                    queue.append(next_id)
+        self.trees[start_id] = distances, parents
+        if len(self.trees) > self.max_trees:
+            self.trees.popitem(last=False)
+        return distances, parents
+
+    def distances(self, word):
+        # How many steps it takes to get from word to every word it can reach
+        distances, _ = self.tree(self.get_id(word))
+        return {self.words[i]: x for i, x in enumerate(distances) if x >= 0}
+
+    def tree_path(self, start_word, end_word):
+        # The shortest ladder between two words using the search tree from the
+        # start word, which is reused for other ladders from the same word
+        _, parents = self.tree(self.get_id(start_word))
+        end_id = self.get_id(end_word)
+        if end_id != self.ids[start_word] and parents[end_id] < 0:
+            return None
+        path = []
+        while end_id >= 0:
+            path.append(self.words[end_id])
+            end_id = parents[end_id]
+        return path[::-1]
+
+    def search(self, start_word, end_word, mode="bfs"):
+        # Same as the search functions, but working with word ids, returns
+        # the ladder as a list of words, and how many words were expanded.  
+        # Words in different components don't need a search at all
+        if not self.connected(start_word, end_word):
+            return None, 0
+        path, expanded = self.get_search(mode)(self.neighbours, self.ids[start_word], self.ids[end_word])
+        return None if path is None else [self.words[x] for x in path], expanded
+
+    def get_search(self, mode):
+        # The search function for a mode, A* needs to compare the words
+        # themselves rather than their ids
+        if mode == "astar":
+            return partial(search_astar, distance=lambda a, b: hamming(self.words[a], self.words[b]))
+        return SEARCHES[mode]
+
+    def search_k_shortest(self, start_word, end_word, k, mode="astar"):
+        # Same as search_k_shortest, but using the index
+        if not self.connected(start_word, end_word):
+            return [], 0
+        paths, expanded = search_k_shortest(self.neighbours, self.ids[start_word], self.ids[end_word], k, self.get_search(mode))
+        return [[self.words[x] for x in path] for path in paths], expanded
+
+    def find_ladder(self, start_word, end_word, mode="bfs"):
+        # Same as find_ladder, but using the index
+        path, _ = self.search(start_word, end_word, mode)
+        return None if path is None else mark_changes(path)
+
+    def close(self):
+        # The views into the memory map need to be let go before it can close
+        for name in ("offsets", "neighbour_ids", "view"):
+            if getattr(self, name, None) is not None:
+                getattr(self, name).release()
+                setattr(self, name, None)
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# Indexes we've already opened, so a long running process only opens each once
+_indexes = {}
+
+def get_index(words_fn=DEFAULT_WORDS):
+    # Open the index for a word list, building it first if needed.  The name
+    # of the index includes a hash of the word list, so a changed word list
+    # gets a new index
+    if words_fn not in _indexes:
+        import hashlib
+        with open(download_words(words_fn), "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:16]
+        index_fn = f"{os.path.splitext(words_fn)[0]}.{digest}.index"
+        if not os.path.isfile(index_fn):
+            build_index(words_fn, index_fn)
+        _indexes[words_fn] = LadderIndex(index_fn)
+    return _indexes[words_fn]
+
+def read_queries(fn):
+    # Read pairs of words, one pair per line, from a file or stdin for "-".
+    # Blank lines are skipped, and any other line that isn't two words gives
+    # a dict with the error, so the results still line up with the lines
+    f = sys.stdin if fn == "-" else open(fn, "rt", encoding="utf-8")
+    try:
+        for row in f:
+            words = row.split()
+            if len(words) == 2:
+                yield words[0].lower(), words[1].lower()
+            elif len(words) > 0:
+                yield {"query": row.strip(), "error": f"Expected two words, got {len(words)}"}
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def run_queries(index, pairs, mode="bfs"):
+    # Answer a list of pairs against an index, returning a dict for each, in
+    # the same order, with the ladder (None if there isn't one), or the error
+    # if it failed.  Pairs are grouped by their start word, and a word that 
+    # starts more than one pair gets a single search out to every word, 
+    # which then answers all of its pairs.  Any dicts in pairs, like the
+    # errors from read_queries, are passed through as they are
+    pairs = list(pairs)
+    ret = [None] * len(pairs)
+    groups = defaultdict(list)
+    for i, pair in enumerate(pairs):
+        if isinstance(pair, dict):
+            ret[i] = pair
+        else:
+            groups[pair[0]].append(i)
+
+    for start_word, group in groups.items():
+        for i in group:
+            end_word = pairs[i][1]
+            try:
+                if len(group) > 1:
+                    path = index.tree_path(start_word, end_word) if index.connected(start_word, end_word) else None
+                else:
+                    path, _ = index.search(start_word, end_word, mode)
+            except Exception as e:
+                ret[i] = {"start": start_word, "end": end_word, "error": str(e)}
+                continue
+            ret[i] = {"start": start_word, "end": end_word, "ladder": path}
+    return ret
+
+def main():
+    # Options, BIDIRECTIONAL to search from both ends at once, and STATS to 
+    # show how many words each search had to look at.  INDEX uses the saved
+    # index of the word graph, building it if needed, and QUERIES=<file> 
+    # answers each pair of words in a file (or stdin for "-") with the index, 
+    # outputting JSON lines.  COMPONENTS shows how the words are split up into
+    # groups that have ladders between them, and DISTANCES=<word> outputs how
+    # far each word is from the given word.  WORDS=<path> uses a different 
+    # word list, with words of any length.  ASTAR uses an A* search, and K=<n>
+    # finds up to n of the shortest ladders for each pair.  Anything else is 
+    # taken as pairs of words to find ladders for
+    mode, show_stats, use_index, queries, args = "bfs", False, False, None, []
+    words_fn, action, k = DEFAULT_WORDS, None, None
+    for cur in sys.argv[1:]:
+        if cur == "BIDIRECTIONAL":
+            mode = "bidirectional"
+        elif cur == "ASTAR":
+            mode = "astar"
+        elif cur.startswith("K="):
+            k = int(cur[2:])
+        elif cur == "STATS":
+            show_stats = True
+        elif cur == "INDEX":
+            use_index = True
+        elif cur.startswith("QUERIES="):
+            queries = cur[8:]
+        elif cur.startswith("WORDS="):
+            words_fn = cur[6:]
+        elif cur == "COMPONENTS" or cur.startswith("DISTANCES="):
+            action = cur
+        else:
+            args.append(cur.lower())
+
+    if action == "COMPONENTS":
+        sizes = sorted(Counter(get_index(words_fn).components()).values(), reverse=True)
+        print(f"{len(sizes)} components, {sum(1 for x in sizes if x == 1)} of them are a single word")
+        print("Largest: " + ", ".join(str(x) for x in sizes[:10]))
+        return
+    if action is not None:
+        distances = get_index(words_fn).distances(action[10:].lower())
+        for word, distance in sorted(distances.items(), key=lambda x: (x[1], x[0])):
+            print(json.dumps({"word": word, "distance": distance}))
+        return
+
+    if queries is not None:
+        for result in run_queries(get_index(words_fn), read_queries(queries), mode):
+            print(json.dumps(result), flush=True)
+        return
+
+    if use_index:
+        index = get_index(words_fn)
+        search, search_k = index.search, index.search_k_shortest
+    else:
+        words = load_words(words_fn)
+        search = lambda start_word, end_word, mode: SEARCHES[mode](words.neighbours, start_word, end_word)
+        search_k = lambda start_word, end_word, k, mode: search_k_shortest(words.neighbours, start_word, end_word, k, SEARCHES[mode])
+
+    # And now find the ladders for each given pair:
+    if len(args) > 0:
+        pairs = [args[i:i + 2] for i in range(0, len(args) - 1, 2)]
+    else:
+        pairs = [
+            ['stone', 'money'],
+            ['bread', 'crumb'],
+            ['smile', 'giant'],
+            ['apple', 'zebra'],
+            ['other', 'night'],
+            ['bread', 'blood'],
+            ['black', 'white'],
+        ]
+
+    for start_word, end_word in pairs:
+        print("")
+        print(f"{start_word} to {end_word}:")
+        try:
+            if k is None:
+                path, expanded = search(start_word, end_word, mode)
+                paths = [] if path is None else [path]
+            else:
+                paths, expanded = search_k(start_word, end_word, k, mode)
+        except Exception as e:
+            print(e)
+            continue
+        if len(paths) == 0:
+            print("No ladder found!")
+        for path in paths:
+            # Dump out the path
+            print(f"{len(path)} steps for {start_word} to {end_word}")
+            print(" -> ".join(mark_changes(path)))
+        if show_stats:
+            print(f"Expanded {expanded} words")
 
-        # Add each word from each placeholder to the stack of things to try
-        for placeholder in get_placeholders(cur_word):
-            for next_word in words[placeholder]:
-                if next_word not in seen:
-                    seen.add(next_word)
-                    # Just to make it obvious which letter is changing
-                    changed_letter = placeholder.index(".")
-                    changed_word = next_word[:changed_letter] + next_word[changed_letter].upper() + next_word[changed_letter+1:]
-                    stack.appendleft((next_word, path + [changed_word]))
+if __name__ == "__main__":
+    main()
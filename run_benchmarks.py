@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+
+# Benchmarks for the encoders and decoders across the challenges.  Everything
+# runs with fixed seeds on fixture data generated locally, so nothing needs
+# to be downloaded and runs can be compared.  Each case is timed a few times,
+# keeping the fastest, then run once more under tracemalloc to find the peak
+# memory use.
+#
+# Usage:
+#   run_benchmarks.py [names] [QUICK] [SAVE_BASELINE] [BASELINE=<path>] [THRESHOLD=<ratio>] [REPEAT=<n>]
+#   run_benchmarks.py COMPARE [names]
+#
+# With SAVE_BASELINE the results are saved to the baseline file, otherwise
+# they're compared against it, and anything slower than the baseline by more
+# than THRESHOLD (1.25 by default) is flagged as a regression.  Timings depend
+# on the machine, so save a baseline and compare against it on the same one.
+#
+# COMPARE instead runs the side by side comparisons of old and new code from
+# challenge_002/benchmarks.py, using the same generated fixtures
+
+from contextlib import redirect_stdout
+import gzip, io, json, os, random, subprocess, sys, tempfile, time, tracemalloc
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+for challenge in ["challenge_002", "challenge_003", "challenge_008"]:
+    sys.path.insert(0, os.path.join(ROOT, challenge))
+
+BASELINE = os.path.join(ROOT, "benchmark_baseline.json")
+THRESHOLD = 1.25
+# How many times to time each case, the fastest time is used
+REPEAT = 3
+# Use smaller input sizes, for a quick check
+QUICK = False
+
+def make_scrabble_words(fn, count=150000, seed=1):
+    # A fake word list for scrabble.py, with letters picked based off how
+    # common they are in the tile bag, big enough to build a full cipher
+    import scrabble
+    rng = random.Random(seed)
+    letters = "".join(k * v for k, v in scrabble.DRAW_BAG.items() if k != "*")
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(2, 9))))
+    with gzip.open(fn, "wt") as f:
+        f.write("\n".join(sorted(words)))
+
+def make_ladder_words(fn, count, seed=1):
+    # A fake list of five letter words for word_ladders.py.  New words are made
+    # by changing one letter of an existing word, so there are plenty of ladders
+    rng = random.Random(seed)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(5)) for _ in range(count // 100)]
+    seen = set(words)
+    while len(words) < count:
+        word = list(rng.choice(words))
+        word[rng.randrange(5)] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+        word = "".join(word)
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    rng.shuffle(words)
+    with open(fn, "wt") as f:
+        f.write("\n".join(words) + "\n")
+    return words
+
+# The generated ladder word lists, by size, so each is only made once
+_ladder_words = {}
+
+def ladder_fixture(fixtures, size):
+    # The word list for the word_ladders cases, as the file name and the list
+    # of words, along with a RNG to pick words from it with
+    fn = os.path.join(fixtures, f"ladder-words-{size}.txt")
+    if fn not in _ladder_words:
+        _ladder_words[fn] = make_ladder_words(fn, size)
+    return fn, _ladder_words[fn], random.Random(1)
+
+def random_pairs(rng, words, count):
+    return [(rng.choice(words), rng.choice(words)) for _ in range(count)]
+
+def random_strings(count, chars, length, seed=1):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(chars) for _ in range(rng.randint(1, length))) for _ in range(count)]
+
+# Each benchmark takes the fixture directory and a size, and returns a
+# function to time along with how many items it handles.  The setup,
+# like building the inputs, isn't included in the timing
+
+def bench_sudoku_encode(fixtures, size):
+    import sudoku
+    values = random_strings(size, sudoku.CHARS[1:], 8)
+    def run():
+        random.seed(42)
+        for value in values:
+            sudoku.encode_value(value)
+    return run, size
+
+def bench_sudoku_solve(fixtures, size):
+    import sudoku
+    random.seed(42)
+    puzzles = [sudoku.encode_value(value)[0] for value in random_strings(size, sudoku.CHARS[1:], 8)]
+    def run():
+        random.seed(42)
+        for puzzle in puzzles:
+            sudoku.add_solution(puzzle)
+    return run, size
+
+def bench_sudoku_decode(fixtures, size):
+    import sudoku
+    random.seed(42)
+    solved = [sudoku.encode_value(value)[1] for value in random_strings(50, sudoku.CHARS[1:], 8)]
+    grids = (solved * (size // len(solved) + 1))[:size]
+    def run():
+        for grid in grids:
+            sudoku.decode_grid(grid)
+    return run, size
+
+def bench_scrabble_encode(fixtures, size):
+    import scrabble
+    scrabble.get_word_index()
+    words = random_strings(size, scrabble.TO_ENCODE, scrabble.MAX_CHARS)
+    def run():
+        for i, word in enumerate(words):
+            try:
+                scrabble.encode_item(word, seed=i)
+            except Exception:
+                # Some words don't find a board, that's still work done
+                pass
+    return run, size
+
+def bench_scrabble_decode(fixtures, size):
+    import scrabble
+    boards = []
+    for i, word in enumerate(random_strings(50, scrabble.TO_ENCODE, scrabble.MAX_CHARS)):
+        random.seed(i)
+        board = scrabble.build_board(word)
+        if board is not None:
+            boards.append(board.rows())
+    boards = (boards * (size // len(boards) + 1))[:size]
+    cipher = scrabble.get_common_middle_letters()
+    def run():
+        scrabble.decode_grids(boards, cipher)
+    return run, size
+
+def bench_word_ladders(fixtures, size, mode="bfs"):
+    import word_ladders
+    fn, all_words, rng = ladder_fixture(fixtures, size)
+    words = word_ladders.load_words(fn)
+    pairs = random_pairs(rng, all_words, 20)
+    def run():
+        expanded = 0
+        for start_word, end_word in pairs:
+            expanded += word_ladders.SEARCHES[mode](words.neighbours, start_word, end_word)[1]
+        return {"expanded": expanded}
+    return run, len(pairs)
+
+def bench_word_ladders_bidirectional(fixtures, size):
+    return bench_word_ladders(fixtures, size, "bidirectional")
+
+def bench_word_ladders_astar(fixtures, size):
+    return bench_word_ladders(fixtures, size, "astar")
+
+def bench_word_ladders_k_shortest(fixtures, size):
+    # The 3 shortest ladders for a few pairs, each one takes a search from
+    # every word along the ladders already found, so this is much slower
+    import word_ladders
+    fn, all_words, rng = ladder_fixture(fixtures, size)
+    index = word_ladders.get_index(fn)
+    pairs = []
+    while len(pairs) < 5:
+        # Only use pairs that have a ladder
+        start_word, end_word = rng.choice(all_words), rng.choice(all_words)
+        if start_word != end_word and index.connected(start_word, end_word):
+            pairs.append((start_word, end_word))
+    def run():
+        expanded = 0
+        for start_word, end_word in pairs:
+            expanded += index.search_k_shortest(start_word, end_word, 3)[1]
+        return {"expanded": expanded}
+    return run, len(pairs)
+
+def bench_word_ladders_index(fixtures, size):
+    # The same searches, using the saved index of the word graph
+    import word_ladders
+    fn, all_words, rng = ladder_fixture(fixtures, size)
+    index = word_ladders.get_index(fn)
+    pairs = random_pairs(rng, all_words, 20)
+    def run():
+        for start_word, end_word in pairs:
+            index.find_ladder(start_word, end_word)
+    return run, len(pairs)
+
+def bench_word_ladders_batch(fixtures, size):
+    # A batch of queries from a handful of start words, answered together
+    import word_ladders
+    fn, all_words, rng = ladder_fixture(fixtures, size)
+    index = word_ladders.get_index(fn)
+    starts = [rng.choice(all_words) for _ in range(20)]
+    pairs = [(rng.choice(starts), rng.choice(all_words)) for _ in range(1000)]
+    def run():
+        # Forget the saved searches, so each run starts from scratch
+        index.trees.clear()
+        word_ladders.run_queries(index, pairs)
+    return run, len(pairs)
+
+def bench_snowflake(fixtures, size):
+    import snowflake
+    def run():
+        for seed in range(10):
+            snowflake.make_snowflake(ice="Xo.", size=size, seed=seed, grid={})
+    return run, 10
+
+def bench_baby_talk(fixtures, size):
+    # baby_talk.py is a script that reads stdin, so run its code directly with
+    # stdin and stdout swapped out, to skip the cost of starting Python
+    fn = os.path.join(ROOT, "challenge_001", "baby_talk.py")
+    with open(fn, "rt", encoding="utf-8") as f:
+        code = compile(f.read(), fn, "exec")
+    with open(os.path.join(ROOT, "challenge_001", "sample_01.txt"), "rt", encoding="utf-8") as f:
+        text = f.read() * size
+    def run():
+        random.seed(42)
+        old_stdin = sys.stdin
+        sys.stdin = io.StringIO(text)
+        try:
+            with redirect_stdout(io.StringIO()):
+                exec(code, {"__name__": "baby_talk"})
+        finally:
+            sys.stdin = old_stdin
+    return run, len(text)
+
+# The benchmarks, with the input sizes for each, and the smaller sizes to use
+# for a quick run
+BENCHMARKS = {
+    "sudoku_encode": (bench_sudoku_encode, [5, 20], [2]),
+    "sudoku_solve": (bench_sudoku_solve, [10, 50], [5]),
+    "sudoku_decode": (bench_sudoku_decode, [1000, 10000], [1000]),
+    "scrabble_encode": (bench_scrabble_encode, [5, 20], [2]),
+    "scrabble_decode": (bench_scrabble_decode, [1000, 10000], [1000]),
+    "word_ladders": (bench_word_ladders, [2000, 10000], [2000]),
+    "word_ladders_bidirectional": (bench_word_ladders_bidirectional, [2000, 10000], [2000]),
+    "word_ladders_astar": (bench_word_ladders_astar, [2000, 10000], [2000]),
+    "word_ladders_k_shortest": (bench_word_ladders_k_shortest, [2000, 10000], [2000]),
+    "word_ladders_index": (bench_word_ladders_index, [2000, 10000], [2000]),
+    "word_ladders_batch": (bench_word_ladders_batch, [2000, 10000], [2000]),
+    "snowflake": (bench_snowflake, [20, 40], [20]),
+    "baby_talk": (bench_baby_talk, [10, 100], [10]),
+}
+
+def run_case(func, fixtures, size):
+    # Time one case, then run it again to find the peak memory use, only the
+    # part being timed counts towards either.  If the case returns a dict of
+    # counts, like how many nodes a search expanded, those are kept as well
+    run, items = func(fixtures, size)
+    elapsed, counts = None, None
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        counts = run()
+        took = time.perf_counter() - started
+        if elapsed is None or took < elapsed:
+            elapsed = took
+
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    ret = {"seconds": elapsed, "items": items, "per_second": items / elapsed if elapsed else 0, "peak_bytes": peak}
+    if isinstance(counts, dict):
+        ret.update(counts)
+    return ret
+
+def get_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    global BASELINE, THRESHOLD, QUICK, REPEAT
+    import benchmarks
+    names, save, compare = [], False, False
+    for cur in sys.argv[1:]:
+        if cur == "COMPARE":
+            compare = True
+        elif cur == "QUICK":
+            QUICK = True
+        elif cur == "SAVE_BASELINE":
+            save = True
+        elif cur.startswith("BASELINE="):
+            BASELINE = cur[9:]
+        elif cur.startswith("THRESHOLD="):
+            THRESHOLD = float(cur[10:])
+        elif cur.startswith("REPEAT="):
+            REPEAT = int(cur[7:])
+        else:
+            names.append(cur)
+    known = benchmarks.BENCHMARKS if compare else BENCHMARKS
+    for name in names:
+        if name not in known:
+            print(f"Unknown option '{name}', benchmarks are: {', '.join(known)}")
+            exit(1)
+    if len(names) == 0:
+        names = list(known)
+
+    if compare:
+        # The comparisons check their own results, and don't have a baseline
+        with tempfile.TemporaryDirectory() as fixtures:
+            cwd = os.getcwd()
+            os.chdir(fixtures)
+            try:
+                if any(x.startswith("scrabble") for x in names):
+                    make_scrabble_words(os.path.join(fixtures, "collins-2019.jsonl.gz"))
+                benchmarks.run_comparisons(names)
+            finally:
+                os.chdir(cwd)
+        return
+
+    baseline = None
+    if not save and os.path.isfile(BASELINE):
+        with open(BASELINE, "rt", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Comparing against the baseline from revision {baseline['revision']}")
+
+    results, regressions = {}, []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as fixtures:
+        # scrabble.py looks for its word list in the current directory
+        os.chdir(fixtures)
+        try:
+            if any(x.startswith("scrabble") for x in names):
+                make_scrabble_words(os.path.join(fixtures, "collins-2019.jsonl.gz"))
+
+            print(f"{'Benchmark':<36} {'Time':>9} {'Items/sec':>12} {'Peak mem':>10}")
+            for name in names:
+                func, sizes, quick_sizes = BENCHMARKS[name]
+                for size in quick_sizes if QUICK else sizes:
+                    key = f"{name}[{size}]"
+                    result = run_case(func, fixtures, size)
+                    results[key] = result
+                    line = f"{key:<36} {result['seconds']:8.3f}s {result['per_second']:12.1f} {result['peak_bytes'] / 1048576:8.2f}MB"
+                    if "expanded" in result:
+                        line += f"  {result['expanded']} expanded"
+                    if baseline is not None and key in baseline["results"]:
+                        ratio = result["seconds"] / max(baseline["results"][key]["seconds"], 1e-9)
+                        line += f"  {ratio:5.2f}x baseline"
+                        if ratio > THRESHOLD:
+                            line += "  REGRESSION"
+                            regressions.append(key)
+                    print(line, flush=True)
+        finally:
+            os.chdir(cwd)
+
+    if save:
+        with open(BASELINE, "wt", newline="", encoding="utf-8") as f:
+            json.dump({"revision": get_revision(), "python": sys.version.split()[0], "results": results}, f, indent=2)
+        print(f"Saved baseline to {BASELINE}")
+
+    if len(regressions):
+        print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+        exit(1)
+
+if __name__ == "__main__":
+    main()